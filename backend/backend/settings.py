@@ -131,6 +131,21 @@ SIMPLE_JWT = {
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
 }
 
+# Billing
+# When True, new shared bills are left undistributed and fanned out by the
+# distribute_shared_bills management command instead of during the request.
+SHARED_BILL_ASYNC_DISTRIBUTION = False
+
+# How long an Idempotency-Key sent to POST /api/billing/payments/ is remembered
+IDEMPOTENCY_KEY_TTL_HOURS = 24
+# How long an in-flight request holds its key; a retry after this takes the key over
+IDEMPOTENCY_KEY_LEASE_SECONDS = 60
+
+# Uploaded bill/payment screenshots are recompressed and thumbnailed after the
+# request on a small thread pool; set ASYNC to False to do it on commit instead.
+SCREENSHOT_PROCESSING_ASYNC = True
+SCREENSHOT_PROCESSING_WORKERS = 2
+
 # Internationalization
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'UTC'
@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import Bill, Payment
+from .models import (
+    Bill, Payment, PenaltyRun, LateFeePolicy, PenaltyEntry, RecurringBillTemplate,
+    UtilityTariff, MeterReading
+)
 
 @admin.register(Bill)
 class BillAdmin(admin.ModelAdmin):
@@ -15,4 +18,38 @@ class PaymentAdmin(admin.ModelAdmin):
     search_fields = ('bill__resident__user__username', 'transaction_id')
     raw_id_fields = ('bill',)
 
-# Register your models here.
+@admin.register(PenaltyRun)
+class PenaltyRunAdmin(admin.ModelAdmin):
+    list_display = ('run_date', 'bills_penalized', 'total_penalty', 'created_at')
+    readonly_fields = ('run_date', 'bills_penalized', 'total_penalty')
+
+@admin.register(LateFeePolicy)
+class LateFeePolicyAdmin(admin.ModelAdmin):
+    list_display = ('union_leader', 'bill_type', 'fee_type', 'amount', 'rate', 'grace_days', 'cap', 'is_active')
+    list_filter = ('fee_type', 'is_active')
+    raw_id_fields = ('union_leader',)
+
+@admin.register(PenaltyEntry)
+class PenaltyEntryAdmin(admin.ModelAdmin):
+    list_display = ('bill', 'entry_type', 'amount', 'entry_date', 'run')
+    list_filter = ('entry_type', 'entry_date')
+    raw_id_fields = ('bill', 'run', 'policy')
+
+@admin.register(RecurringBillTemplate)
+class RecurringBillTemplateAdmin(admin.ModelAdmin):
+    list_display = ('name', 'union_leader', 'bill_type', 'frequency', 'amount_rule', 'amount', 'target', 'is_active')
+    list_filter = ('frequency', 'bill_type', 'is_active')
+    search_fields = ('name', 'description')
+    raw_id_fields = ('union_leader', 'residents')
+
+@admin.register(UtilityTariff)
+class UtilityTariffAdmin(admin.ModelAdmin):
+    list_display = ('union_leader', 'utility', 'fixed_charge', 'due_days')
+    list_filter = ('utility',)
+    raw_id_fields = ('union_leader',)
+
+@admin.register(MeterReading)
+class MeterReadingAdmin(admin.ModelAdmin):
+    list_display = ('home', 'utility', 'period', 'reading', 'consumption', 'bill')
+    list_filter = ('utility', 'period')
+    raw_id_fields = ('union_leader', 'home', 'bill')
@@ -0,0 +1,85 @@
+"""Splitting an amount between residents in exact cents.
+
+allocate() turns any list of weights into shares that always sum to the
+amount: every share is floored to the cent first, then the leftover cents go
+to the shares with the largest remainders (earlier shares win ties), so the
+same inputs always give the same split. allocate_to_residents() derives the
+weights from the residents' homes for the SharedBill and Expense fan-outs.
+"""
+from decimal import Decimal
+
+ALLOCATION_METHODS = [
+    ('equal', 'Equal shares'),
+    ('area', 'By home area'),
+    ('bedrooms', 'By bedrooms'),
+    ('custom', 'Custom weights'),
+]
+
+
+class AllocationError(ValueError):
+    pass
+
+
+def allocate(amount, weights):
+    """Split amount into cent-exact shares proportional to weights."""
+    weights = [Decimal(str(weight)) for weight in weights]
+    if any(weight < 0 for weight in weights):
+        raise AllocationError('Weights cannot be negative')
+    total = sum(weights)
+    if not weights or total <= 0:
+        raise AllocationError('At least one weight must be positive')
+    cents = int((Decimal(amount) * 100).to_integral_value())
+    exact = [cents * weight / total for weight in weights]
+    shares = [int(value) for value in exact]
+    leftover = cents - sum(shares)
+    by_remainder = sorted(range(len(weights)), key=lambda i: (shares[i] - exact[i], i))
+    for i in by_remainder[:leftover]:
+        shares[i] += 1
+    return [Decimal(share) / 100 for share in shares]
+
+
+def resident_weights(residents, method='equal', custom_weights=None):
+    """Weights for residents (with their homes loaded) under an allocation method.
+
+    Residents without a home weigh nothing under the area and bedroom
+    methods; custom_weights maps resident ids (as ints or strings) to weights.
+    """
+    if method == 'equal':
+        return [1] * len(residents)
+    if method == 'area':
+        return [resident.home.area if resident.home else 0 for resident in residents]
+    if method == 'bedrooms':
+        return [resident.home.bedrooms if resident.home else 0 for resident in residents]
+    if method == 'custom':
+        custom_weights = custom_weights or {}
+        return [custom_weights.get(str(resident.pk), custom_weights.get(resident.pk, 0)) for resident in residents]
+    raise AllocationError(f'Unknown allocation method: {method}')
+
+
+def allocate_to_residents(amount, residents, method='equal', custom_weights=None):
+    """Return (resident, share) pairs for every resident with a non-zero share.
+
+    If no resident has a home to weigh by area or bedrooms, the amount is
+    split equally instead.
+    """
+    weights = resident_weights(residents, method, custom_weights)
+    if method in ('area', 'bedrooms') and not any(weights):
+        weights = [1] * len(residents)
+    shares = allocate(amount, weights)
+    return [(resident, share) for resident, share in zip(residents, shares) if share]
+
+
+def validate_custom_weights(weights):
+    """Return an error message for a malformed custom weight mapping, or None."""
+    if not isinstance(weights, dict) or not weights:
+        return 'Custom weights must map resident ids to weights'
+    values = []
+    try:
+        for resident_id, weight in weights.items():
+            int(resident_id)
+            values.append(Decimal(str(weight)))
+    except (TypeError, ValueError, ArithmeticError):
+        return 'Custom weights must map resident ids to numbers'
+    if any(value < 0 for value in values) or not any(values):
+        return 'Custom weights must be non-negative with at least one positive weight'
+    return None
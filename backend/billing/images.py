@@ -0,0 +1,119 @@
+"""Background optimisation of uploaded bill and payment screenshots.
+
+Uploads are saved as-is during the request; once the transaction commits the
+instance is handed to a small thread pool that strips metadata, downscales and
+recompresses the image in place and writes a thumbnail next to it. Anything
+the pool misses (e.g. a restart mid-queue) is picked up by the
+process_screenshots management command, which looks for images without a
+thumbnail.
+"""
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+MAX_DIMENSION = 1600
+THUMBNAIL_SIZE = (320, 320)
+JPEG_QUALITY = 80
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'SCREENSHOT_PROCESSING_WORKERS', 2),
+            thread_name_prefix='screenshots'
+        )
+    return _executor
+
+
+def _encode_jpeg(image):
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=JPEG_QUALITY, optimize=True)
+    return buffer.getvalue()
+
+
+def optimise_image(field_file):
+    """Return (image_bytes, thumbnail_bytes) as metadata-free JPEGs."""
+    field_file.open('rb')
+    try:
+        with Image.open(field_file) as original:
+            # Apply the EXIF rotation before the metadata is dropped
+            image = ImageOps.exif_transpose(original).convert('RGB')
+    finally:
+        field_file.close()
+    image.thumbnail((MAX_DIMENSION, MAX_DIMENSION))
+    thumbnail = image.copy()
+    thumbnail.thumbnail(THUMBNAIL_SIZE)
+    return _encode_jpeg(image), _encode_jpeg(thumbnail)
+
+
+def process_screenshots(model, pk):
+    """Optimise every screenshot on one instance that has no thumbnail yet."""
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None:
+        return
+    updates = {}
+    for image_field, thumbnail_field in model.SCREENSHOT_FIELDS:
+        field_file = getattr(instance, image_field)
+        if not field_file or getattr(instance, thumbnail_field):
+            continue
+        try:
+            image_bytes, thumbnail_bytes = optimise_image(field_file)
+        except (UnidentifiedImageError, OSError):
+            logger.warning('Could not process %s %s for %s %s', image_field, field_file.name, model.__name__, pk)
+            continue
+        old_name = field_file.name
+        stem = os.path.splitext(os.path.basename(old_name))[0]
+        field_file.save(f'{stem}.jpg', ContentFile(image_bytes), save=False)
+        if field_file.name != old_name:
+            field_file.storage.delete(old_name)
+        thumbnail = getattr(instance, thumbnail_field)
+        thumbnail.save(f'{stem}_thumb.jpg', ContentFile(thumbnail_bytes), save=False)
+        updates[image_field] = field_file.name
+        updates[thumbnail_field] = thumbnail.name
+    if updates:
+        # A plain UPDATE, so Bill/Payment.save side effects do not run again
+        model.objects.filter(pk=pk).update(**updates)
+
+
+def _run(model, pk):
+    try:
+        process_screenshots(model, pk)
+    except Exception:
+        logger.exception('Screenshot processing failed for %s %s', model.__name__, pk)
+    finally:
+        close_old_connections()
+
+
+def queue_screenshot_processing(instance):
+    """Process instance's screenshots on the worker pool once the current transaction commits."""
+    model, pk = type(instance), instance.pk
+    if not getattr(settings, 'SCREENSHOT_PROCESSING_ASYNC', True):
+        transaction.on_commit(lambda: process_screenshots(model, pk))
+        return
+    transaction.on_commit(lambda: _get_executor().submit(_run, model, pk))
+
+
+def has_new_upload(instance):
+    """True if any screenshot on instance holds a file not yet written to storage.
+
+    Call before save(); also clears the thumbnail of each replaced image so it
+    is regenerated.
+    """
+    uploaded = False
+    for image_field, thumbnail_field in instance.SCREENSHOT_FIELDS:
+        field_file = getattr(instance, image_field)
+        if field_file and not field_file._committed:
+            setattr(instance, thumbnail_field, None)
+            uploaded = True
+    return uploaded
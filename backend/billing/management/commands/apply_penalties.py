@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+from billing.models import PenaltyRun
+from datetime import datetime
+
+class Command(BaseCommand):
+    help = 'Accrue late fees on all overdue bills from the late fee policies (schedule this daily, e.g. from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Treat bills due before this date (YYYY-MM-DD) as overdue; defaults to today')
+
+    def handle(self, *args, **options):
+        as_of = None
+        if options['date']:
+            try:
+                as_of = datetime.strptime(options['date'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('--date must be in YYYY-MM-DD format')
+
+        run = PenaltyRun.run(as_of=as_of)
+        self.stdout.write(self.style.SUCCESS(
+            f'Accrued late fees on {run.bills_penalized} bills for a total of {run.total_penalty} (as of {run.run_date})'
+        ))
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from billing.models import Bill, Payment, Expense, PENALTY_STATUSES
+
+class Command(BaseCommand):
+    help = 'EXPLAIN the hot billing queries and verify each one is served by its composite index'
+
+    def handle(self, *args, **kwargs):
+        today = timezone.now().date()
+        leader_id = 0
+        # (description, queryset, index expected in the plan)
+        checks = [
+            ('Bill list by status and due date',
+             Bill.objects.filter(union_leader_id=leader_id, status='pending', due_date__gte=today),
+             'bill_leader_status_due_idx'),
+            ('Bill list default ordering',
+             Bill.objects.filter(union_leader_id=leader_id).order_by('-created_at'),
+             'bill_leader_created_idx'),
+            ('Resident rent bill lookup',
+             Bill.objects.filter(resident_id=0, bill_type='rent', due_date=today),
+             'bill_resident_type_due_idx'),
+            ('Overdue penalty sweep',
+             Bill.objects.filter(status__in=PENALTY_STATUSES, due_date__lt=today, penalty_waived=False),
+             'bill_status_due_idx'),
+            ('Approved payments for a bill',
+             Payment.objects.filter(bill_id=0, status='approved'),
+             'payment_bill_status_idx'),
+            ('Approved expenses for a union leader',
+             Expense.objects.filter(union_leader_id=leader_id, status='approved', date__year=today.year),
+             'expense_leader_status_date_idx'),
+        ]
+
+        missing = []
+        for description, queryset, index_name in checks:
+            plan = queryset.explain()
+            if index_name in plan:
+                self.stdout.write(self.style.SUCCESS(f'{description}: uses {index_name}'))
+            else:
+                missing.append(description)
+                self.stdout.write(self.style.WARNING(f'{description}: {index_name} not used'))
+                self.stdout.write(plan)
+
+        if missing:
+            raise CommandError(f'{len(missing)} billing queries are not using their indexes')
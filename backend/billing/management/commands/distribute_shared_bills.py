@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from billing.allocation import AllocationError
+from billing.models import SharedBill
+
+class Command(BaseCommand):
+    help = 'Fan out shared bills that have not been distributed to residents yet'
+
+    def handle(self, *args, **kwargs):
+        total_bills = 0
+        distributed = 0
+        for shared_bill in SharedBill.objects.filter(distributed=False).order_by('pk').iterator():
+            try:
+                created = shared_bill.distribute()
+            except AllocationError as exc:
+                self.stderr.write(f'Skipped shared bill {shared_bill.pk}: {exc}')
+                continue
+            if created:
+                distributed += 1
+                total_bills += created
+        self.stdout.write(self.style.SUCCESS(f'Distributed {distributed} shared bills into {total_bills} resident bills'))
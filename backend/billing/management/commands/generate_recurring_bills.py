@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+from billing.models import RecurringBillTemplate
+from datetime import datetime
+
+class Command(BaseCommand):
+    help = 'Create the bills of every active recurring bill template for the current period (schedule this daily, e.g. from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Generate for the period containing this date (YYYY-MM-DD); defaults to today')
+
+    def handle(self, *args, **options):
+        as_of = None
+        if options['date']:
+            try:
+                as_of = datetime.strptime(options['date'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('--date must be in YYYY-MM-DD format')
+
+        templates_due, bills_created = RecurringBillTemplate.generate(as_of=as_of)
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {bills_created} bills from {templates_due} recurring bill templates'
+        ))
@@ -0,0 +1,41 @@
+import csv
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+from billing.reconciliation import parse_statement, reconcile_statement, StatementError
+
+User = get_user_model()
+
+class Command(BaseCommand):
+    help = "Reconcile a bank statement (CSV or OFX) against a union leader's open bills"
+
+    def add_arguments(self, parser):
+        parser.add_argument('statement', help='Path to the CSV or OFX statement file')
+        parser.add_argument('--leader', required=True, help='Username of the union leader whose bills are reconciled')
+        parser.add_argument('--dry-run', action='store_true', help='Match lines without writing any payments')
+        parser.add_argument('--report', help='Write the lines that need manual review to this CSV file')
+
+    def handle(self, *args, **options):
+        try:
+            leader = User.objects.get(username=options['leader'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named {options['leader']}")
+        try:
+            with open(options['statement'], 'rb') as statement:
+                lines = parse_statement(statement.read(), options['statement'])
+        except (OSError, StatementError) as e:
+            raise CommandError(str(e))
+
+        result = reconcile_statement(lines, leader, dry_run=options['dry_run'])
+
+        if options['report'] and result['review']:
+            with open(options['report'], 'w', newline='') as report:
+                writer = csv.DictWriter(report, fieldnames=list(result['review'][0]))
+                writer.writeheader()
+                writer.writerows(result['review'])
+
+        prefix = 'Dry run: ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}{result['lines']} lines, {len(result['matched'])} matched "
+            f"({result['payments_approved']} payments approved, {result['payments_created']} created), "
+            f"{len(result['review'])} need review"
+        ))
@@ -0,0 +1,45 @@
+import csv
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+from billing.meters import parse_readings, parse_period, bill_readings, MeterReadingError
+
+User = get_user_model()
+
+class Command(BaseCommand):
+    help = "Record a CSV of meter readings for one utility and period and bill each home's consumption"
+
+    def add_arguments(self, parser):
+        parser.add_argument('readings', help='Path to the CSV file (home_id or block/number, reading, optional reading_date)')
+        parser.add_argument('--leader', required=True, help='Username of the union leader whose homes are billed')
+        parser.add_argument('--utility', required=True, choices=['water', 'electricity', 'gas'])
+        parser.add_argument('--period', required=True, help='Billing month (YYYY-MM)')
+        parser.add_argument('--dry-run', action='store_true', help='Compute the charges without writing readings or bills')
+        parser.add_argument('--report', help='Write the rows that need review to this CSV file')
+
+    def handle(self, *args, **options):
+        try:
+            leader = User.objects.get(username=options['leader'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named {options['leader']}")
+        period = parse_period(options['period'])
+        if period is None:
+            raise CommandError('--period must be in YYYY-MM format')
+        try:
+            with open(options['readings'], 'rb') as readings:
+                rows = parse_readings(readings.read())
+            result = bill_readings(rows, leader, options['utility'], period, dry_run=options['dry_run'])
+        except (OSError, MeterReadingError) as e:
+            raise CommandError(str(e))
+
+        if options['report'] and result['review']:
+            with open(options['report'], 'w', newline='') as report:
+                writer = csv.DictWriter(report, fieldnames=list(result['review'][0]))
+                writer.writeheader()
+                writer.writerows(result['review'])
+
+        prefix = 'Dry run: ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}{result['lines']} rows, {result['readings_recorded']} readings recorded "
+            f"({result['baseline_readings']} baseline), {result['bills_created']} bills for {result['total_amount']}, "
+            f"{len(result['review'])} need review"
+        ))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from billing.images import process_screenshots
+from billing.models import Bill, Payment
+
+class Command(BaseCommand):
+    help = 'Recompress and thumbnail bill and payment screenshots that have not been processed yet'
+
+    def handle(self, *args, **kwargs):
+        for model in (Bill, Payment):
+            pending = Q()
+            for image_field, thumbnail_field in model.SCREENSHOT_FIELDS:
+                pending |= (
+                    Q(**{f'{image_field}__isnull': False}) & ~Q(**{image_field: ''})
+                    & (Q(**{f'{thumbnail_field}__isnull': True}) | Q(**{thumbnail_field: ''}))
+                )
+            count = 0
+            for pk in model.objects.filter(pending).values_list('pk', flat=True).iterator():
+                process_screenshots(model, pk)
+                count += 1
+            self.stdout.write(self.style.SUCCESS(f'Processed screenshots for {count} {model._meta.verbose_name_plural}'))
@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from billing.models import ExpenseRollup
+
+class Command(BaseCommand):
+    help = 'Rebuild the monthly expense rollups behind the expense summary from the expense table'
+
+    def handle(self, *args, **kwargs):
+        count = ExpenseRollup.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} expense rollup rows'))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F, Q
+from billing.models import Bill
+
+class Command(BaseCommand):
+    help = 'Verify Bill.amount_paid/amount_approved against the payments table and optionally repair drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Rewrite drifted balances from the payments table')
+
+    def handle(self, *args, **options):
+        drifted = Bill.objects.with_computed_balances().filter(
+            ~Q(amount_paid=F('computed_paid')) | ~Q(amount_approved=F('computed_approved'))
+        )
+        count = 0
+        for bill in drifted.only('id', 'amount_paid', 'amount_approved').iterator():
+            count += 1
+            self.stdout.write(
+                f'Bill {bill.id}: amount_paid {bill.amount_paid} != {bill.computed_paid} '
+                f'or amount_approved {bill.amount_approved} != {bill.computed_approved}'
+            )
+
+        if not count:
+            self.stdout.write(self.style.SUCCESS('All bill balances match their payments'))
+            return
+
+        if options['fix']:
+            repaired = Bill.objects.filter(pk__in=drifted.values('pk')).with_computed_balances().update(
+                amount_paid=F('computed_paid'),
+                amount_approved=F('computed_approved'),
+            )
+            self.stdout.write(self.style.SUCCESS(f'Repaired {repaired} bills'))
+        else:
+            self.stdout.write(self.style.WARNING(f'{count} bills have drifted; run with --fix to repair'))
@@ -0,0 +1,202 @@
+"""Meter reading import and slab-tariff utility billing.
+
+A CSV of per-home readings for one utility and period is matched to the
+union leader's occupied homes, each home's previous reading is fetched in the
+same query, and consumption and charges are computed for all homes together,
+one tariff slab at a time over the whole consumption column. The readings and
+the resulting utility bills are then written with bulk inserts.
+"""
+import csv
+import io
+import re
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from datetime import timedelta
+
+from homes.models import Home
+from residents.models import Resident
+from .models import Bill, MeterReading, UtilityTariff, BULK_BATCH_SIZE
+
+CENT = Decimal('0.01')
+
+
+class MeterReadingError(ValueError):
+    pass
+
+
+def _parse_day(value):
+    try:
+        return parse_date(value)
+    except ValueError:
+        return None
+
+
+def parse_readings(data):
+    """Parse CSV bytes or text into dicts with line_number, home_id, block, number, reading and reading_date.
+
+    Homes are identified by a home_id column or by block and number columns.
+    """
+    text = data.decode('utf-8-sig', errors='replace') if isinstance(data, bytes) else data
+    reader = csv.DictReader(io.StringIO(text))
+    if not reader.fieldnames:
+        raise MeterReadingError('The readings file has no header row')
+    headers = {re.sub(r'[\s-]+', '_', name.strip().lower()): name for name in reader.fieldnames if name}
+    if 'reading' not in headers:
+        raise MeterReadingError('The readings file needs a reading column')
+    if 'home_id' not in headers and not {'block', 'number'} <= set(headers):
+        raise MeterReadingError('The readings file needs a home_id column or block and number columns')
+
+    def column(row, name):
+        return (row.get(headers[name]) or '').strip() if name in headers else ''
+
+    rows = []
+    for line_number, row in enumerate(reader, start=2):
+        try:
+            reading = Decimal(column(row, 'reading').replace(',', ''))
+        except InvalidOperation:
+            reading = None
+        rows.append({
+            'line_number': line_number,
+            'home_id': int(column(row, 'home_id')) if column(row, 'home_id').isdigit() else None,
+            'block': column(row, 'block'),
+            'number': column(row, 'number'),
+            'reading': reading,
+            'reading_date': _parse_day(column(row, 'reading_date')),
+        })
+    return rows
+
+
+def parse_period(value):
+    """Parse 'YYYY-MM' or a date into the first day of that month; None if invalid."""
+    value = str(value or '').strip()
+    day = _parse_day(f'{value}-01' if len(value) == 7 else value)
+    return day.replace(day=1) if day else None
+
+
+def slab_charges(consumption, slabs, fixed_charge=0):
+    """Charge for every value in a consumption column under a slab tariff.
+
+    Works slab by slab across the whole column rather than home by home:
+    each pass adds the units that fall inside one slab times its rate.
+    """
+    charges = [Decimal(fixed_charge)] * len(consumption)
+    lower = Decimal('0')
+    for slab in slabs:
+        rate = Decimal(str(slab['rate']))
+        upper = None if slab['up_to'] is None else Decimal(str(slab['up_to']))
+        if upper is None:
+            units = [max(used - lower, 0) for used in consumption]
+        else:
+            units = [min(max(used - lower, 0), upper - lower) for used in consumption]
+        charges = [charge + rate * used for charge, used in zip(charges, units)]
+        if upper is None:
+            break
+        lower = upper
+    return [charge.quantize(CENT) for charge in charges]
+
+
+def bill_readings(rows, union_leader, utility, period, dry_run=False):
+    """Record a period's readings and bill each home's consumption under union_leader's tariff.
+
+    A home's first reading only sets its baseline. Returns a report dict
+    with the counts, the billed total and the rows left for review.
+    """
+    period = period.replace(day=1)
+    tariff = UtilityTariff.objects.filter(union_leader=union_leader, utility=utility).first()
+    if tariff is None:
+        raise MeterReadingError(f'No {utility} tariff is set up')
+
+    previous = MeterReading.objects.filter(home=OuterRef('pk'), utility=utility, period__lt=period).order_by('-period')
+    homes = (
+        Home.objects.filter(residents__union_leader=union_leader, residents__is_active=True).distinct()
+        .annotate(
+            previous_reading=Subquery(previous.values('reading')[:1]),
+            already_read=Subquery(
+                MeterReading.objects.filter(home=OuterRef('pk'), utility=utility, period=period).values('pk')[:1]
+            ),
+        )
+        .values('id', 'block', 'number', 'previous_reading', 'already_read')
+    )
+    homes_by_id = {home['id']: home for home in homes}
+    homes_by_label = {(home['block'].lower(), home['number'].lower()): home for home in homes_by_id.values()}
+    # The home's bill goes to its longest-standing active resident
+    billed_resident = {}
+    for resident_id, home_id in (
+        Resident.objects.filter(union_leader=union_leader, is_active=True, home_id__in=homes_by_id)
+        .order_by('-pk').values_list('pk', 'home_id')
+    ):
+        billed_resident[home_id] = resident_id
+
+    review, accepted, seen = [], [], set()
+
+    def flag(row, reason):
+        review.append({**row, 'reason': reason})
+
+    for row in rows:
+        home = homes_by_id.get(row['home_id']) if row['home_id'] else homes_by_label.get((row['block'].lower(), row['number'].lower()))
+        if home is None:
+            flag(row, 'unknown_home')
+        elif row['reading'] is None or row['reading'] < 0:
+            flag(row, 'unreadable_reading')
+        elif home['id'] in seen:
+            flag(row, 'duplicate_in_file')
+        elif home['already_read']:
+            flag(row, 'already_recorded')
+        elif home['previous_reading'] is not None and row['reading'] < home['previous_reading']:
+            flag(row, 'reading_below_previous')
+        else:
+            seen.add(home['id'])
+            accepted.append((row, home))
+
+    # Vectorized pass over the homes that have a previous reading
+    metered = [(row, home) for row, home in accepted if home['previous_reading'] is not None]
+    consumption = [row['reading'] - home['previous_reading'] for row, home in metered]
+    charges = slab_charges(consumption, tariff.slabs, tariff.fixed_charge)
+
+    due_date = period + timedelta(days=tariff.due_days)
+    today = timezone.now().date()
+    bills = {
+        home['id']: Bill(
+            resident_id=billed_resident[home['id']],
+            amount=charge,
+            due_date=due_date,
+            bill_type='utilities',
+            description=f'{utility.title()} {period.strftime("%B %Y")}: {used} units',
+            union_leader=union_leader,
+        )
+        for (row, home), used, charge in zip(metered, consumption, charges)
+        if charge > 0
+    }
+    if not dry_run and accepted:
+        with transaction.atomic():
+            Bill.objects.bulk_create(bills.values(), batch_size=BULK_BATCH_SIZE)
+            MeterReading.objects.bulk_create([
+                MeterReading(
+                    union_leader=union_leader,
+                    home_id=home['id'],
+                    utility=utility,
+                    period=period,
+                    reading=row['reading'],
+                    reading_date=row['reading_date'] or today,
+                    previous_reading=home['previous_reading'],
+                    consumption=None if home['previous_reading'] is None else row['reading'] - home['previous_reading'],
+                    bill=bills.get(home['id']),
+                )
+                for row, home in accepted
+            ], batch_size=BULK_BATCH_SIZE)
+
+    return {
+        'dry_run': dry_run,
+        'utility': utility,
+        'period': period,
+        'lines': len(rows),
+        'readings_recorded': len(accepted),
+        'baseline_readings': len(accepted) - len(metered),
+        'bills_created': len(bills),
+        'total_amount': sum(charges, Decimal('0.00')),
+        'review': review,
+    }
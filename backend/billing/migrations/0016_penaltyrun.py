@@ -0,0 +1,28 @@
+# Generated by Django 4.2.20 on 2026-10-18 08:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0015_alter_expense_is_shared'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PenaltyRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('run_date', models.DateField(help_text='Bills due before this date were considered overdue')),
+                ('rate', models.DecimalField(decimal_places=4, max_digits=5)),
+                ('bills_penalized', models.PositiveIntegerField(default=0)),
+                ('total_penalty', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.20 on 2026-10-18 08:35
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_balances(apps, schema_editor):
+    Bill = apps.get_model('billing', 'Bill')
+    Payment = apps.get_model('billing', 'Payment')
+    money = models.DecimalField(max_digits=12, decimal_places=2)
+
+    def payment_total(payments):
+        total = payments.filter(bill=OuterRef('pk')).order_by().values('bill').annotate(
+            total=Sum('amount')
+        ).values('total')
+        return Coalesce(Subquery(total, output_field=money), Value(Decimal('0')), output_field=money)
+
+    Bill.objects.update(
+        amount_paid=payment_total(Payment.objects.exclude(status='rejected')),
+        amount_approved=payment_total(Payment.objects.filter(status='approved')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0016_penaltyrun'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bill',
+            name='amount_approved',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Sum of approved payments, maintained by Payment', max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='bill',
+            name='amount_paid',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Sum of pending and approved payments, maintained by Payment', max_digits=10),
+        ),
+        migrations.RunPython(backfill_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.20 on 2026-10-18 08:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+
+def backfill_rollups(apps, schema_editor):
+    Expense = apps.get_model('billing', 'Expense')
+    ExpenseRollup = apps.get_model('billing', 'ExpenseRollup')
+    rows = Expense.objects.filter(union_leader__isnull=False).annotate(
+        year=ExtractYear('date'), month=ExtractMonth('date')
+    ).order_by().values('union_leader_id', 'year', 'month', 'category', 'status').annotate(
+        total=Sum('amount'), count=Count('id')
+    )
+    ExpenseRollup.objects.bulk_create([ExpenseRollup(**row) for row in rows], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('billing', '0018_billing_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExpenseRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('month', models.PositiveSmallIntegerField()),
+                ('category', models.CharField(max_length=20)),
+                ('status', models.CharField(max_length=20)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('union_leader', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='expense_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='expenserollup',
+            constraint=models.UniqueConstraint(fields=('union_leader', 'year', 'month', 'category', 'status'), name='unique_expense_rollup'),
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
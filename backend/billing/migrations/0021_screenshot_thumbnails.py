@@ -0,0 +1,28 @@
+# Generated by Django 4.2.20 on 2026-10-18 08:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0020_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bill',
+            name='payment_screenshot_thumbnail',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='payment_screenshots/thumbnails/'),
+        ),
+        migrations.AddField(
+            model_name='bill',
+            name='screenshot_thumbnail',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='bill_screenshots/thumbnails/'),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='screenshot_thumbnail',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='payment_screenshots/thumbnails/'),
+        ),
+    ]
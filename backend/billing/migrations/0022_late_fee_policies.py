@@ -0,0 +1,100 @@
+# Generated by Django 4.2.20 on 2026-10-18 08:48
+
+from django.conf import settings
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import F
+import django.db.models.deletion
+
+
+def move_penalties_to_ledger(apps, schema_editor):
+    """Take existing penalties out of Bill.amount into the ledger and keep the old 10% rule as each leader's policy."""
+    Bill = apps.get_model('billing', 'Bill')
+    LateFeePolicy = apps.get_model('billing', 'LateFeePolicy')
+    PenaltyEntry = apps.get_model('billing', 'PenaltyEntry')
+
+    penalized = Bill.objects.filter(penalty_amount__gt=0)
+    PenaltyEntry.objects.bulk_create([
+        PenaltyEntry(bill_id=bill_id, entry_type='accrual', amount=penalty, entry_date=due_date)
+        for bill_id, penalty, due_date in penalized.values_list('id', 'penalty_amount', 'due_date').iterator()
+    ], batch_size=500)
+    penalized.update(amount=F('amount') - F('penalty_amount'))
+
+    leader_ids = Bill.objects.exclude(union_leader=None).values_list('union_leader_id', flat=True).distinct()
+    LateFeePolicy.objects.bulk_create([
+        LateFeePolicy(union_leader_id=leader_id, bill_type='', fee_type='percentage', rate=Decimal('0.10'))
+        for leader_id in leader_ids
+    ])
+
+
+def restore_penalties_to_amount(apps, schema_editor):
+    Bill = apps.get_model('billing', 'Bill')
+    Bill.objects.filter(penalty_amount__gt=0).update(amount=F('amount') + F('penalty_amount'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('billing', '0021_screenshot_thumbnails'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LateFeePolicy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('bill_type', models.CharField(blank=True, choices=[('rent', 'Rent'), ('utilities', 'Utilities'), ('maintenance', 'Maintenance'), ('salaries', 'Salaries'), ('marketing', 'Marketing'), ('insurance', 'Insurance'), ('taxes', 'Taxes'), ('other', 'Other'), ('shared_expense', 'Shared Expense')], help_text='Leave blank to cover every bill type without its own policy', max_length=20)),
+                ('fee_type', models.CharField(choices=[('flat', 'Flat fee'), ('percentage', 'Percentage of the bill'), ('daily', 'Daily accrual')], default='percentage', max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, help_text='Flat fee, or the fixed part charged per day for daily accrual', max_digits=10)),
+                ('rate', models.DecimalField(decimal_places=4, default=0, help_text='Fraction of the bill amount, per day for daily accrual', max_digits=7)),
+                ('compound', models.BooleanField(default=False, help_text='Daily accrual only: charge the rate on the penalty accrued so far as well')),
+                ('grace_days', models.PositiveIntegerField(default=0, help_text='Days after the due date before any fee accrues')),
+                ('cap', models.DecimalField(blank=True, decimal_places=2, help_text='Maximum total penalty per bill', max_digits=10, null=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('union_leader', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='late_fee_policies', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'late fee policies',
+            },
+        ),
+        migrations.RemoveField(
+            model_name='penaltyrun',
+            name='rate',
+        ),
+        migrations.AddField(
+            model_name='bill',
+            name='penalty_waived',
+            field=models.BooleanField(default=False, help_text='Stops further late fees on this bill'),
+        ),
+        migrations.AlterField(
+            model_name='bill',
+            name='penalty_amount',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Late fees owed on top of amount, maintained from PenaltyEntry', max_digits=10),
+        ),
+        migrations.CreateModel(
+            name='PenaltyEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('entry_type', models.CharField(choices=[('accrual', 'Accrual'), ('waiver', 'Waiver')], max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('entry_date', models.DateField()),
+                ('bill', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='penalty_entries', to='billing.bill')),
+                ('policy', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='entries', to='billing.latefeepolicy')),
+                ('run', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='entries', to='billing.penaltyrun')),
+            ],
+            options={
+                'verbose_name_plural': 'penalty entries',
+                'indexes': [models.Index(fields=['bill', 'entry_date'], name='penalty_bill_date_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='latefeepolicy',
+            constraint=models.UniqueConstraint(fields=('union_leader', 'bill_type'), name='unique_late_fee_policy'),
+        ),
+        migrations.RunPython(move_penalties_to_ledger, restore_penalties_to_amount),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 4.2.20 on 2026-10-18 08:49
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('residents', '0006_resident_union_leader'),
+        ('billing', '0022_late_fee_policies'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecurringBillTemplate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('name', models.CharField(max_length=100)),
+                ('bill_type', models.CharField(choices=[('rent', 'Rent'), ('utilities', 'Utilities'), ('maintenance', 'Maintenance'), ('salaries', 'Salaries'), ('marketing', 'Marketing'), ('insurance', 'Insurance'), ('taxes', 'Taxes'), ('security', 'Security'), ('other', 'Other'), ('shared_expense', 'Shared Expense')], max_length=20)),
+                ('description', models.TextField(blank=True)),
+                ('frequency', models.CharField(choices=[('monthly', 'Monthly'), ('quarterly', 'Quarterly'), ('yearly', 'Yearly')], default='monthly', max_length=20)),
+                ('amount_rule', models.CharField(choices=[('fixed', 'Fixed amount per resident'), ('split', 'Amount split evenly between residents'), ('per_area', 'Amount per square foot of the home')], default='fixed', max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('target', models.CharField(choices=[('all', 'All active residents'), ('block', 'Active residents of one block'), ('selected', 'Selected residents')], default='all', max_length=20)),
+                ('target_block', models.CharField(blank=True, max_length=50)),
+                ('start_date', models.DateField(help_text='Periods are counted from this date')),
+                ('end_date', models.DateField(blank=True, null=True)),
+                ('due_days', models.PositiveIntegerField(default=0, help_text='Days after the start of the period that the bill is due')),
+                ('is_active', models.BooleanField(default=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.AddField(
+            model_name='bill',
+            name='period',
+            field=models.DateField(blank=True, help_text='First day of the billing period, for bills generated from a recurring template', null=True),
+        ),
+        migrations.AlterField(
+            model_name='bill',
+            name='bill_type',
+            field=models.CharField(choices=[('rent', 'Rent'), ('utilities', 'Utilities'), ('maintenance', 'Maintenance'), ('salaries', 'Salaries'), ('marketing', 'Marketing'), ('insurance', 'Insurance'), ('taxes', 'Taxes'), ('security', 'Security'), ('other', 'Other'), ('shared_expense', 'Shared Expense')], max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='latefeepolicy',
+            name='bill_type',
+            field=models.CharField(blank=True, choices=[('rent', 'Rent'), ('utilities', 'Utilities'), ('maintenance', 'Maintenance'), ('salaries', 'Salaries'), ('marketing', 'Marketing'), ('insurance', 'Insurance'), ('taxes', 'Taxes'), ('security', 'Security'), ('other', 'Other'), ('shared_expense', 'Shared Expense')], help_text='Leave blank to cover every bill type without its own policy', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='recurringbilltemplate',
+            name='residents',
+            field=models.ManyToManyField(blank=True, related_name='recurring_bill_templates', to='residents.resident'),
+        ),
+        migrations.AddField(
+            model_name='recurringbilltemplate',
+            name='union_leader',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recurring_bill_templates', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='bill',
+            name='recurring_template',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='bills', to='billing.recurringbilltemplate'),
+        ),
+        migrations.AddConstraint(
+            model_name='bill',
+            constraint=models.UniqueConstraint(fields=('recurring_template', 'resident', 'period'), name='unique_recurring_bill'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 4.2.20 on 2026-10-18 08:50
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('homes', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('billing', '0023_recurring_bill_templates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UtilityTariff',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('utility', models.CharField(choices=[('water', 'Water'), ('electricity', 'Electricity'), ('gas', 'Gas')], max_length=20)),
+                ('fixed_charge', models.DecimalField(decimal_places=2, default=0, help_text='Charged every period regardless of consumption', max_digits=10)),
+                ('slabs', models.JSONField(default=list)),
+                ('due_days', models.PositiveIntegerField(default=14, help_text='Days after the reading period starts that the bill is due')),
+                ('union_leader', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='utility_tariffs', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MeterReading',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('utility', models.CharField(choices=[('water', 'Water'), ('electricity', 'Electricity'), ('gas', 'Gas')], max_length=20)),
+                ('period', models.DateField()),
+                ('reading', models.DecimalField(decimal_places=3, max_digits=12)),
+                ('reading_date', models.DateField()),
+                ('previous_reading', models.DecimalField(blank=True, decimal_places=3, max_digits=12, null=True)),
+                ('consumption', models.DecimalField(blank=True, decimal_places=3, help_text="Empty for a home's first reading", max_digits=12, null=True)),
+                ('bill', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='meter_readings', to='billing.bill')),
+                ('home', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='meter_readings', to='homes.home')),
+                ('union_leader', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='meter_readings', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-period', 'home_id'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='utilitytariff',
+            constraint=models.UniqueConstraint(fields=('union_leader', 'utility'), name='unique_utility_tariff'),
+        ),
+        migrations.AddConstraint(
+            model_name='meterreading',
+            constraint=models.UniqueConstraint(fields=('home', 'utility', 'period'), name='unique_meter_reading'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.20 on 2026-10-18 08:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0024_meter_readings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='expense',
+            name='allocation_method',
+            field=models.CharField(choices=[('equal', 'Equal shares'), ('area', 'By home area'), ('bedrooms', 'By bedrooms'), ('custom', 'Custom weights')], default='equal', help_text='How a shared expense is split between residents', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='expense',
+            name='allocation_weights',
+            field=models.JSONField(blank=True, default=dict, help_text='Resident id to weight, for custom allocation'),
+        ),
+        migrations.AddField(
+            model_name='sharedbill',
+            name='allocation_method',
+            field=models.CharField(choices=[('equal', 'Equal shares'), ('area', 'By home area'), ('bedrooms', 'By bedrooms'), ('custom', 'Custom weights')], default='equal', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='sharedbill',
+            name='allocation_weights',
+            field=models.JSONField(blank=True, default=dict, help_text='Resident id to weight, for custom allocation'),
+        ),
+    ]
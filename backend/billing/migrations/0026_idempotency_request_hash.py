@@ -0,0 +1,18 @@
+# Generated by Django 4.2.20 on 2026-10-18 09:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0025_allocation_methods'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='idempotencykey',
+            name='request_hash',
+            field=models.CharField(blank=True, help_text='SHA-256 of the request body the key was first used with', max_length=64),
+        ),
+    ]
@@ -1,8 +1,19 @@
-from django.db import models
+import calendar
+import hashlib
+import json
+from django.db import models, transaction
+from django.db.models import F, Q, Sum, Count, Exists, OuterRef, Subquery, Value, DecimalField
+from django.db.models.functions import Coalesce, ExtractYear, ExtractMonth
 from django.conf import settings
+from django.utils import timezone
+from datetime import timedelta
 from decimal import Decimal
 from core.models import TimeStampedModel
 from residents.models import Resident
+from .images import has_new_upload, queue_screenshot_processing
+from .allocation import ALLOCATION_METHODS, allocate, allocate_to_residents
+
+BULK_BATCH_SIZE = 500
 
 class SharedBill(TimeStampedModel):
     amount = models.DecimalField(max_digits=10, decimal_places=2)
@@ -21,33 +32,78 @@ class SharedBill(TimeStampedModel):
     description = models.TextField(blank=True)
     distributed = models.BooleanField(default=False)
     union_leader = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='shared_bills', help_text='The union leader/admin responsible for this bill')
+    allocation_method = models.CharField(max_length=20, choices=ALLOCATION_METHODS, default='equal')
+    allocation_weights = models.JSONField(default=dict, blank=True, help_text='Resident id to weight, for custom allocation')
     
     def save(self, *args, **kwargs):
         is_new = self.pk is None
-        super().save(*args, **kwargs)
-        
-        # Only distribute if it's a new shared bill and hasn't been distributed yet
-        if is_new and not self.distributed:
-            residents = Resident.objects.filter(is_active=True, union_leader=self.union_leader)
-            resident_count = residents.count()
-            if resident_count > 0:
-                amount_per_resident = Decimal(self.amount) / Decimal(resident_count)
-                for resident in residents:
-                    Bill.objects.create(
-                        resident=resident,
-                        shared_bill=self,
-                        amount=amount_per_resident,
-                        due_date=self.due_date,
-                        bill_type=self.bill_type,
-                        description=self.description,
-                        union_leader=self.union_leader
-                    )
+        # A failed fan-out (AllocationError) must not leave an undistributed shared bill behind
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+            # Only distribute if it's a new shared bill and hasn't been distributed yet.
+            # Large societies can defer the fan-out to the distribute_shared_bills command.
+            if is_new and not self.distributed and not getattr(settings, 'SHARED_BILL_ASYNC_DISTRIBUTION', False):
+                self.distribute()
+
+    def distribute(self):
+        """Create one Bill per active resident of the union leader in a single bulk insert.
+
+        The amount is split with allocation_method (see billing.allocation).
+
+        Returns the number of bills created. Safe to call more than once: the
+        shared bill row is locked and the distributed flag re-checked first.
+        """
+        with transaction.atomic():
+            locked = SharedBill.objects.select_for_update().get(pk=self.pk)
+            if locked.distributed:
                 self.distributed = True
-                self.save(update_fields=['distributed'])
+                return 0
+            residents = list(
+                Resident.objects.filter(is_active=True, union_leader=self.union_leader)
+                .select_related('home').order_by('pk')
+            )
+            if not residents:
+                return 0
+            shares = allocate_to_residents(self.amount, residents, self.allocation_method, self.allocation_weights)
+            Bill.objects.bulk_create([
+                Bill(
+                    resident=resident,
+                    shared_bill=self,
+                    amount=share,
+                    due_date=self.due_date,
+                    bill_type=self.bill_type,
+                    description=self.description,
+                    union_leader=self.union_leader
+                )
+                for resident, share in shares
+            ], batch_size=BULK_BATCH_SIZE)
+            SharedBill.objects.filter(pk=self.pk).update(distributed=True)
+            self.distributed = True
+            return len(shares)
     
     def __str__(self):
         return f'{self.bill_type} - {self.amount} - {self.due_date}'
 
+class BillQuerySet(models.QuerySet):
+    def with_computed_balances(self):
+        """Annotate computed_paid and computed_approved summed from the payments table.
+
+        Used to verify the denormalized amount_paid/amount_approved columns.
+        """
+        money = DecimalField(max_digits=12, decimal_places=2)
+
+        def payment_total(payments):
+            total = payments.filter(bill=OuterRef('pk')).order_by().values('bill').annotate(
+                total=Sum('amount')
+            ).values('total')
+            return Coalesce(Subquery(total, output_field=money), Value(Decimal('0')), output_field=money)
+
+        return self.annotate(
+            computed_paid=payment_total(Payment.objects.exclude(status='rejected')),
+            computed_approved=payment_total(Payment.objects.filter(status='approved')),
+        )
+
 class Bill(TimeStampedModel):
     resident = models.ForeignKey(Resident, on_delete=models.CASCADE, related_name='bills')
     shared_bill = models.ForeignKey(SharedBill, on_delete=models.CASCADE, related_name='resident_bills', null=True)
@@ -61,6 +117,7 @@ class Bill(TimeStampedModel):
         ('marketing', 'Marketing'),
         ('insurance', 'Insurance'),
         ('taxes', 'Taxes'),
+        ('security', 'Security'),
         ('other', 'Other'),
         ('shared_expense', 'Shared Expense'),
     ])
@@ -72,14 +129,430 @@ class Bill(TimeStampedModel):
     description = models.TextField(blank=True)
     screenshot = models.ImageField(upload_to='bill_screenshots/', blank=True, null=True)
     payment_screenshot = models.ImageField(upload_to='payment_screenshots/', blank=True, null=True)
+    screenshot_thumbnail = models.ImageField(upload_to='bill_screenshots/thumbnails/', blank=True, null=True, editable=False)
+    payment_screenshot_thumbnail = models.ImageField(upload_to='payment_screenshots/thumbnails/', blank=True, null=True, editable=False)
     payment_date = models.DateField(null=True, blank=True)
     payment_notes = models.TextField(blank=True)
     union_leader = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='bills', help_text='The union leader/admin responsible for this bill')
-    penalty_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    penalty_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0, help_text='Late fees owed on top of amount, maintained from PenaltyEntry')
+    penalty_waived = models.BooleanField(default=False, help_text='Stops further late fees on this bill')
+    amount_paid = models.DecimalField(max_digits=10, decimal_places=2, default=0, help_text='Sum of pending and approved payments, maintained by Payment')
+    amount_approved = models.DecimalField(max_digits=10, decimal_places=2, default=0, help_text='Sum of approved payments, maintained by Payment')
+    recurring_template = models.ForeignKey('RecurringBillTemplate', on_delete=models.SET_NULL, null=True, blank=True, related_name='bills')
+    period = models.DateField(null=True, blank=True, help_text='First day of the billing period, for bills generated from a recurring template')
+
+    objects = BillQuerySet.as_manager()
+
+    # (image, thumbnail) pairs optimised off-request by billing.images
+    SCREENSHOT_FIELDS = (('screenshot', 'screenshot_thumbnail'), ('payment_screenshot', 'payment_screenshot_thumbnail'))
+
+    class Meta:
+        indexes = [
+            # BillViewSet list for a union leader, filtered by status and due date
+            models.Index(fields=['union_leader', 'status', 'due_date'], name='bill_leader_status_due_idx'),
+            # Default list ordering for a union leader
+            models.Index(fields=['union_leader', '-created_at'], name='bill_leader_created_idx'),
+            # Resident bill lookups, e.g. the monthly rent anti-join
+            models.Index(fields=['resident', 'bill_type', 'due_date'], name='bill_resident_type_due_idx'),
+            # Overdue penalty sweep
+            models.Index(fields=['status', 'due_date'], name='bill_status_due_idx'),
+        ]
+        constraints = [
+            # One bill per resident per period of a recurring template; generation relies on it to skip existing bills
+            models.UniqueConstraint(fields=['recurring_template', 'resident', 'period'], name='unique_recurring_bill'),
+        ]
+
+    @property
+    def total_due(self):
+        return self.amount + self.penalty_amount
+
+    @property
+    def remaining_amount(self):
+        return self.total_due - self.amount_paid
+
+    def save(self, *args, **kwargs):
+        uploaded = has_new_upload(self)
+        super().save(*args, **kwargs)
+        if uploaded:
+            queue_screenshot_processing(self)
+
+    def settle_status(self):
+        """Set status from amount_approved; does not save."""
+        if self.amount_approved >= self.total_due:
+            self.status = 'paid'
+        elif self.amount_approved > 0:
+            self.status = 'partially_paid'
     
     def __str__(self):
         return f'{self.resident.user.get_full_name()} - {self.bill_type} - {self.amount}'
 
+def add_months(day, months):
+    """Shift a date by whole months, clamping the day to the end of short months."""
+    year, month = divmod(day.year * 12 + day.month - 1 + months, 12)
+    month += 1
+    return day.replace(year=year, month=month, day=min(day.day, calendar.monthrange(year, month)[1]))
+
+class RecurringBillTemplate(TimeStampedModel):
+    """A bill issued to a set of residents every period (maintenance, security, utilities...).
+
+    Bills are materialized by RecurringBillTemplate.generate, normally from the
+    generate_recurring_bills command; each one records its template and period.
+    """
+    FREQUENCY_MONTHS = {'monthly': 1, 'quarterly': 3, 'yearly': 12}
+
+    union_leader = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='recurring_bill_templates')
+    name = models.CharField(max_length=100)
+    bill_type = models.CharField(max_length=20, choices=Bill._meta.get_field('bill_type').choices)
+    description = models.TextField(blank=True)
+    frequency = models.CharField(max_length=20, choices=[
+        ('monthly', 'Monthly'),
+        ('quarterly', 'Quarterly'),
+        ('yearly', 'Yearly')
+    ], default='monthly')
+    amount_rule = models.CharField(max_length=20, choices=[
+        ('fixed', 'Fixed amount per resident'),
+        ('split', 'Amount split evenly between residents'),
+        ('per_area', 'Amount per square foot of the home')
+    ], default='fixed')
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    target = models.CharField(max_length=20, choices=[
+        ('all', 'All active residents'),
+        ('block', 'Active residents of one block'),
+        ('selected', 'Selected residents')
+    ], default='all')
+    target_block = models.CharField(max_length=50, blank=True)
+    residents = models.ManyToManyField(Resident, blank=True, related_name='recurring_bill_templates')
+    start_date = models.DateField(help_text='Periods are counted from this date')
+    end_date = models.DateField(null=True, blank=True)
+    due_days = models.PositiveIntegerField(default=0, help_text='Days after the start of the period that the bill is due')
+    is_active = models.BooleanField(default=True)
+
+    def period_containing(self, day):
+        """First day of this template's period containing day, or None before the template starts."""
+        step = self.FREQUENCY_MONTHS[self.frequency]
+        months = (day.year - self.start_date.year) * 12 + day.month - self.start_date.month
+        # Compare whole dates so a clamped period start (Jan 31 -> Feb 28) counts as reached
+        if day < add_months(self.start_date, months):
+            months -= 1
+        if months < 0:
+            return None
+        return add_months(self.start_date, months - months % step)
+
+    def targets(self, residents):
+        """Pick this template's residents out of its union leader's active residents."""
+        if self.target == 'block':
+            return [r for r in residents if r.home and r.home.block == self.target_block]
+        if self.target == 'selected':
+            selected = {r.pk for r in self.residents.all()}
+            return [r for r in residents if r.pk in selected]
+        return residents
+
+    def amounts(self, residents):
+        if self.amount_rule == 'split':
+            return allocate(self.amount, [1] * len(residents))
+        if self.amount_rule == 'per_area':
+            return [(self.amount * (r.home.area if r.home else 0)).quantize(Decimal('0.01')) for r in residents]
+        return [self.amount] * len(residents)
+
+    def build_bills(self, period, residents):
+        """Unsaved Bills for one period, for the given targeted residents."""
+        due_date = period + timedelta(days=self.due_days)
+        description = self.description or f'{self.name} - {period.strftime("%B %Y")}'
+        return [
+            Bill(
+                resident=resident,
+                amount=amount,
+                due_date=due_date,
+                bill_type=self.bill_type,
+                description=description,
+                union_leader_id=self.union_leader_id,
+                recurring_template=self,
+                period=period
+            )
+            for resident, amount in zip(residents, self.amounts(residents))
+            if amount > 0
+        ]
+
+    @classmethod
+    def generate(cls, as_of=None, union_leader=None):
+        """Materialize the bills of every active template for the period containing as_of.
+
+        All templates (or one union leader's) are handled in one pass: the
+        templates and their leaders' residents are loaded once, and the bills
+        go in through a single bulk insert that lets the unique
+        (template, resident, period) constraint skip bills that already
+        exist. Returns (templates_due, bills_created).
+        """
+        as_of = as_of or timezone.now().date()
+        templates = cls.objects.filter(is_active=True, start_date__lte=as_of).exclude(end_date__lt=as_of)
+        if union_leader is not None:
+            templates = templates.filter(union_leader=union_leader)
+        templates = list(templates.prefetch_related('residents').order_by('pk'))
+
+        residents_by_leader = {}
+        for resident in (
+            Resident.objects.filter(is_active=True, union_leader_id__in={t.union_leader_id for t in templates})
+            .select_related('home').order_by('pk')
+        ):
+            residents_by_leader.setdefault(resident.union_leader_id, []).append(resident)
+
+        bills, due = [], []
+        for template in templates:
+            period = template.period_containing(as_of)
+            if period is None:
+                continue
+            due.append(template.pk)
+            targets = template.targets(residents_by_leader.get(template.union_leader_id, []))
+            if targets:
+                bills.extend(template.build_bills(period, targets))
+
+        generated = Bill.objects.filter(recurring_template_id__in=due)
+        with transaction.atomic():
+            before = generated.count()
+            Bill.objects.bulk_create(bills, batch_size=BULK_BATCH_SIZE, ignore_conflicts=True)
+            created = generated.count() - before
+        return len(due), created
+
+    def __str__(self):
+        return f'{self.name} ({self.frequency})'
+
+# Unpaid bill statuses that keep accruing late fees
+PENALTY_STATUSES = ('pending', 'overdue', 'partially_paid')
+# Late fee for bills whose union leader has no LateFeePolicy rows at all (or no union leader)
+DEFAULT_PENALTY_RATE = Decimal('0.10')
+
+class LateFeePolicy(TimeStampedModel):
+    """How late fees accrue on a union leader's overdue bills.
+
+    A policy for a specific bill type wins over the leader's catch-all policy
+    (blank bill_type).
+    """
+    union_leader = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='late_fee_policies')
+    bill_type = models.CharField(max_length=20, blank=True, choices=Bill._meta.get_field('bill_type').choices, help_text='Leave blank to cover every bill type without its own policy')
+    fee_type = models.CharField(max_length=20, choices=[
+        ('flat', 'Flat fee'),
+        ('percentage', 'Percentage of the bill'),
+        ('daily', 'Daily accrual')
+    ], default='percentage')
+    amount = models.DecimalField(max_digits=10, decimal_places=2, default=0, help_text='Flat fee, or the fixed part charged per day for daily accrual')
+    rate = models.DecimalField(max_digits=7, decimal_places=4, default=0, help_text='Fraction of the bill amount, per day for daily accrual')
+    compound = models.BooleanField(default=False, help_text='Daily accrual only: charge the rate on the penalty accrued so far as well')
+    grace_days = models.PositiveIntegerField(default=0, help_text='Days after the due date before any fee accrues')
+    cap = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, help_text='Maximum total penalty per bill')
+    is_active = models.BooleanField(default=True)
+
+    class Meta:
+        verbose_name_plural = 'late fee policies'
+        constraints = [
+            models.UniqueConstraint(fields=['union_leader', 'bill_type'], name='unique_late_fee_policy'),
+        ]
+
+    @classmethod
+    def default(cls):
+        """Unsaved catch-all policy used for union leaders who have not set up any policy."""
+        return cls(fee_type='percentage', rate=DEFAULT_PENALTY_RATE)
+
+    def penalty_for(self, amount, days_late):
+        """Total penalty owed on a bill of amount that is days_late days past its grace period."""
+        if days_late <= 0:
+            return Decimal('0.00')
+        if self.fee_type == 'flat':
+            penalty = self.amount
+        elif self.fee_type == 'percentage':
+            penalty = amount * self.rate
+        elif self.compound:
+            penalty = amount * ((1 + self.rate) ** days_late - 1) + self.amount * days_late
+        else:
+            penalty = (amount * self.rate + self.amount) * days_late
+        if self.cap is not None:
+            penalty = min(penalty, self.cap)
+        return Decimal(penalty).quantize(Decimal('0.01'))
+
+    def __str__(self):
+        return f'{self.union_leader} - {self.bill_type or "all bills"} - {self.fee_type}'
+
+class PenaltyRun(TimeStampedModel):
+    """Log entry for one sweep of the overdue penalty engine."""
+    run_date = models.DateField(help_text='Bills due before this date were considered overdue')
+    bills_penalized = models.PositiveIntegerField(default=0)
+    total_penalty = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    @classmethod
+    def run(cls, as_of=None):
+        """Accrue late fees on every overdue, unpaid bill as of a date.
+
+        Each bill's policy gives the total penalty owed so far; only the
+        difference from what is already on the bill is written, as one
+        PenaltyEntry per bill, so running the sweep again on the same day
+        adds nothing. Bills are processed in batches with bulk inserts and
+        updates.
+
+        Union leaders with no policy rows, and bills without a union leader,
+        fall back to LateFeePolicy.default(). Once a leader has any policy,
+        only their active policies apply, so an inactive catch-all turns
+        late fees off.
+        """
+        as_of = as_of or timezone.now().date()
+        configured, policies = set(), {}
+        for policy in LateFeePolicy.objects.all():
+            configured.add(policy.union_leader_id)
+            if policy.is_active:
+                policies[(policy.union_leader_id, policy.bill_type)] = policy
+        default_policy = LateFeePolicy.default()
+        with transaction.atomic():
+            run = cls.objects.create(run_date=as_of)
+            overdue = (
+                Bill.objects.select_for_update()
+                .filter(status__in=PENALTY_STATUSES, due_date__lt=as_of, penalty_waived=False)
+                .filter(~Q(union_leader_id__in=configured) | Q(union_leader_id__in={leader_id for leader_id, _ in policies}))
+                .only('id', 'union_leader_id', 'bill_type', 'amount', 'due_date', 'penalty_amount')
+                .order_by('pk')
+            )
+            now = timezone.now()
+            batch_entries, batch_bills = [], []
+            total = Decimal('0.00')
+            penalized = 0
+
+            def flush():
+                PenaltyEntry.objects.bulk_create(batch_entries)
+                Bill.objects.bulk_update(batch_bills, ['penalty_amount', 'updated_at'])
+                batch_entries.clear()
+                batch_bills.clear()
+
+            for bill in overdue.iterator(chunk_size=BULK_BATCH_SIZE):
+                if bill.union_leader_id in configured:
+                    policy = policies.get((bill.union_leader_id, bill.bill_type)) or policies.get((bill.union_leader_id, ''))
+                    if policy is None:
+                        continue
+                else:
+                    policy = default_policy
+                owed = policy.penalty_for(bill.amount, (as_of - bill.due_date).days - policy.grace_days)
+                accrued = owed - bill.penalty_amount
+                if accrued <= 0:
+                    continue
+                batch_entries.append(PenaltyEntry(
+                    bill=bill, run=run, policy=policy if policy.pk else None, entry_type='accrual', amount=accrued,
+                    entry_date=as_of
+                ))
+                bill.penalty_amount = owed
+                bill.updated_at = now
+                batch_bills.append(bill)
+                total += accrued
+                penalized += 1
+                if len(batch_bills) >= BULK_BATCH_SIZE:
+                    flush()
+            flush()
+
+            run.bills_penalized = penalized
+            run.total_penalty = total
+            run.save(update_fields=['bills_penalized', 'total_penalty', 'updated_at'])
+            return run
+
+    def __str__(self):
+        return f'{self.run_date} - {self.bills_penalized} bills - {self.total_penalty}'
+
+class PenaltyEntry(TimeStampedModel):
+    """One movement in a bill's late-fee ledger.
+
+    Bill.penalty_amount is the running total of these rows; waivers are
+    negative entries.
+    """
+    bill = models.ForeignKey(Bill, on_delete=models.CASCADE, related_name='penalty_entries')
+    run = models.ForeignKey(PenaltyRun, on_delete=models.SET_NULL, null=True, blank=True, related_name='entries')
+    policy = models.ForeignKey(LateFeePolicy, on_delete=models.SET_NULL, null=True, blank=True, related_name='entries')
+    entry_type = models.CharField(max_length=20, choices=[
+        ('accrual', 'Accrual'),
+        ('waiver', 'Waiver')
+    ])
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    entry_date = models.DateField()
+
+    class Meta:
+        verbose_name_plural = 'penalty entries'
+        indexes = [
+            models.Index(fields=['bill', 'entry_date'], name='penalty_bill_date_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.bill_id} - {self.entry_type} - {self.amount}'
+
+UTILITY_CHOICES = [
+    ('water', 'Water'),
+    ('electricity', 'Electricity'),
+    ('gas', 'Gas'),
+]
+
+class UtilityTariff(TimeStampedModel):
+    """Slab tariff a union leader bills one metered utility with.
+
+    slabs is an ascending list like [{"up_to": 10, "rate": "2.50"},
+    {"up_to": null, "rate": "4.00"}]: each unit of consumption is charged at
+    the rate of the slab it falls in, and the last slab is open-ended.
+    """
+    union_leader = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='utility_tariffs')
+    utility = models.CharField(max_length=20, choices=UTILITY_CHOICES)
+    fixed_charge = models.DecimalField(max_digits=10, decimal_places=2, default=0, help_text='Charged every period regardless of consumption')
+    slabs = models.JSONField(default=list)
+    due_days = models.PositiveIntegerField(default=14, help_text='Days after the reading period starts that the bill is due')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['union_leader', 'utility'], name='unique_utility_tariff'),
+        ]
+
+    @staticmethod
+    def validate_slabs(slabs):
+        """Return an error message for a malformed slab list, or None."""
+        if not isinstance(slabs, list) or not slabs:
+            return 'slabs must be a non-empty list'
+        previous = Decimal('0')
+        for index, slab in enumerate(slabs):
+            try:
+                rate = Decimal(str(slab['rate']))
+                up_to = slab['up_to']
+                up_to = None if up_to is None else Decimal(str(up_to))
+            except (KeyError, TypeError, ArithmeticError):
+                return f'slab {index + 1} needs a numeric up_to (or null) and rate'
+            if rate < 0:
+                return f'slab {index + 1} has a negative rate'
+            if up_to is None:
+                if index != len(slabs) - 1:
+                    return 'only the last slab may be open-ended'
+            elif up_to <= previous:
+                return 'slab limits must increase'
+            else:
+                previous = up_to
+        if slabs[-1]['up_to'] is not None:
+            return 'the last slab must be open-ended (up_to: null)'
+        return None
+
+    def __str__(self):
+        return f'{self.union_leader} - {self.utility}'
+
+class MeterReading(TimeStampedModel):
+    """A home's meter reading for one utility and billing period (first of the month)."""
+    union_leader = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='meter_readings')
+    home = models.ForeignKey('homes.Home', on_delete=models.CASCADE, related_name='meter_readings')
+    utility = models.CharField(max_length=20, choices=UTILITY_CHOICES)
+    period = models.DateField()
+    reading = models.DecimalField(max_digits=12, decimal_places=3)
+    reading_date = models.DateField()
+    previous_reading = models.DecimalField(max_digits=12, decimal_places=3, null=True, blank=True)
+    consumption = models.DecimalField(max_digits=12, decimal_places=3, null=True, blank=True, help_text='Empty for a home\'s first reading')
+    bill = models.ForeignKey(Bill, on_delete=models.SET_NULL, null=True, blank=True, related_name='meter_readings')
+
+    class Meta:
+        ordering = ['-period', 'home_id']
+        constraints = [
+            models.UniqueConstraint(fields=['home', 'utility', 'period'], name='unique_meter_reading'),
+        ]
+
+    def __str__(self):
+        return f'{self.home} - {self.utility} - {self.period}: {self.reading}'
+
 class Payment(TimeStampedModel):
     bill = models.ForeignKey(Bill, on_delete=models.CASCADE, related_name='payments')
     amount = models.DecimalField(max_digits=10, decimal_places=2)
@@ -93,15 +566,128 @@ class Payment(TimeStampedModel):
     transaction_id = models.CharField(max_length=100, blank=True)
     notes = models.TextField(blank=True)
     screenshot = models.ImageField(upload_to='payment_screenshots/', blank=True, null=True)
+    screenshot_thumbnail = models.ImageField(upload_to='payment_screenshots/thumbnails/', blank=True, null=True, editable=False)
     status = models.CharField(max_length=20, choices=[
         ('pending', 'Pending'),
         ('approved', 'Approved'),
         ('rejected', 'Rejected')
     ], default='pending')
+
+    SCREENSHOT_FIELDS = (('screenshot', 'screenshot_thumbnail'),)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['bill', 'status'], name='payment_bill_status_idx'),
+            models.Index(fields=['-created_at'], name='payment_created_idx'),
+        ]
+
+    def _balance_contribution(self, amount, status):
+        """Return the (amount_paid, amount_approved) this payment adds to its bill."""
+        if status == 'rejected':
+            return Decimal('0'), Decimal('0')
+        amount = Decimal(amount)
+        return amount, (amount if status == 'approved' else Decimal('0'))
+
+    def _shift_bill_balance(self, bill_id, paid, approved):
+        if paid or approved:
+            Bill.objects.filter(pk=bill_id).update(
+                amount_paid=F('amount_paid') + paid,
+                amount_approved=F('amount_approved') + approved,
+            )
+
+    def save(self, *args, **kwargs):
+        # Keep Bill.amount_paid/amount_approved in step with this payment
+        with transaction.atomic():
+            previous = None
+            if self.pk is not None:
+                previous = Payment.objects.filter(pk=self.pk).values('bill_id', 'amount', 'status').first()
+            uploaded = has_new_upload(self)
+            super().save(*args, **kwargs)
+            if previous:
+                paid, approved = self._balance_contribution(previous['amount'], previous['status'])
+                self._shift_bill_balance(previous['bill_id'], -paid, -approved)
+            paid, approved = self._balance_contribution(self.amount, self.status)
+            self._shift_bill_balance(self.bill_id, paid, approved)
+            if uploaded:
+                queue_screenshot_processing(self)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            paid, approved = self._balance_contribution(self.amount, self.status)
+            self._shift_bill_balance(self.bill_id, -paid, -approved)
+            return super().delete(*args, **kwargs)
     
     def __str__(self):
         return f'{self.bill.resident.user.get_full_name()} - {self.amount} - {self.payment_date}'
 
+class ExpenseQuerySet(models.QuerySet):
+    def visible_to_resident(self, user):
+        """Expenses a resident may see: their personal ones plus any they hold a share of.
+
+        Expressed as one WHERE clause with an EXISTS subquery so it stays a
+        single statement and composes with further filters.
+        """
+        has_share = ResidentExpenseShare.objects.filter(expense=OuterRef('pk'), resident__user=user)
+        return self.filter(Q(resident__user=user, is_shared=False) | Exists(has_share))
+
+class IdempotencyKey(models.Model):
+    """A client-supplied Idempotency-Key and the response it produced.
+
+    A row without response_status is a reservation for a request still in
+    flight; it only lasts a short lease, so a worker that dies mid-request
+    does not lock the key out for the full TTL. request_hash ties the key to
+    the request body it was first used with. Rows past expires_at are ignored
+    and purged by purge_idempotency_keys.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='idempotency_keys')
+    scope = models.CharField(max_length=50, help_text='The endpoint the key was used on, e.g. payments.create')
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64, blank=True, help_text='SHA-256 of the request body the key was first used with')
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'scope', 'key'], name='unique_idempotency_key'),
+        ]
+
+    @staticmethod
+    def fingerprint(data):
+        """SHA-256 of request data in a canonical form; uploaded files count by name and size."""
+        if hasattr(data, 'lists'):
+            data = dict(data.lists())
+
+        def encode(value):
+            if hasattr(value, 'read'):
+                return [getattr(value, 'name', ''), getattr(value, 'size', None)]
+            return str(value)
+
+        canonical = json.dumps(data, sort_keys=True, default=encode)
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    @classmethod
+    def reserve(cls, user, scope, key, request_hash=''):
+        """Return (record, created) for key, replacing an expired record or lapsed reservation."""
+        now = timezone.now()
+        lease_until = now + timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_LEASE_SECONDS', 60))
+        with transaction.atomic():
+            cls.objects.filter(user=user, scope=scope, key=key, expires_at__lte=now).delete()
+            return cls.objects.get_or_create(
+                user=user, scope=scope, key=key, defaults={'expires_at': lease_until, 'request_hash': request_hash}
+            )
+
+    def complete(self, response_status, response_body):
+        """Store the response to replay and keep the key for the full TTL."""
+        self.response_status = response_status
+        self.response_body = response_body
+        self.expires_at = timezone.now() + timedelta(hours=getattr(settings, 'IDEMPOTENCY_KEY_TTL_HOURS', 24))
+        self.save(update_fields=['response_status', 'response_body', 'expires_at'])
+
+    def __str__(self):
+        return f'{self.scope} - {self.key} - {self.response_status}'
+
 class Expense(TimeStampedModel):
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     date = models.DateField()
@@ -127,46 +713,151 @@ class Expense(TimeStampedModel):
     approved_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='approved_expenses')
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='created_expenses')
     union_leader = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='expenses', help_text='The union leader/admin responsible for this expense')
+    allocation_method = models.CharField(max_length=20, choices=ALLOCATION_METHODS, default='equal', help_text='How a shared expense is split between residents')
+    allocation_weights = models.JSONField(default=dict, blank=True, help_text='Resident id to weight, for custom allocation')
+
+    objects = ExpenseQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['union_leader', 'status', 'date'], name='expense_leader_status_date_idx'),
+        ]
 
     def distribute_shares(self):
+        """Create a Bill and a ResidentExpenseShare for every active resident.
+
+        The amount is split with allocation_method (see billing.allocation).
+        Bills and shares are each inserted with one bulk query inside a single
+        transaction. The expense row is locked first so concurrent approvals
+        cannot distribute the same expense twice.
+        """
         if self.share_distributed:
             return
-        residents = Resident.objects.filter(is_active=True, union_leader=self.created_by)
-        resident_count = residents.count()
-        if resident_count > 0:
-            amount_per_resident = Decimal(self.amount) / Decimal(resident_count)
-            for resident in residents:
-                bill = Bill.objects.create(
+        with transaction.atomic():
+            locked = Expense.objects.select_for_update().get(pk=self.pk)
+            if locked.share_distributed:
+                self.share_distributed = True
+                return
+            residents = list(
+                Resident.objects.filter(is_active=True, union_leader=self.created_by)
+                .select_related('home').order_by('pk')
+            )
+            if not residents:
+                return
+            shares = allocate_to_residents(self.amount, residents, self.allocation_method, self.allocation_weights)
+            bills = Bill.objects.bulk_create([
+                Bill(
                     resident=resident,
-                    amount=amount_per_resident,
+                    amount=share,
                     due_date=self.date,  # or set a due date as needed
                     bill_type=self.category,  # Use the expense category as the bill type
                     description=f'Shared expense: {self.category} - {self.description}',
                     union_leader=self.created_by
                 )
-                ResidentExpenseShare.objects.create(
+                for resident, share in shares
+            ], batch_size=BULK_BATCH_SIZE)
+            ResidentExpenseShare.objects.bulk_create([
+                ResidentExpenseShare(
                     expense=self,
-                    resident=resident,
-                    share_amount=amount_per_resident,
+                    resident_id=bill.resident_id,
+                    share_amount=bill.amount,
                     bill=bill
                 )
+                for bill in bills
+            ], batch_size=BULK_BATCH_SIZE)
+            Expense.objects.filter(pk=self.pk).update(share_distributed=True)
             self.share_distributed = True
-            self.save(update_fields=['share_distributed'])
 
     def save(self, *args, **kwargs):
-        is_new = self.pk is None
-        super().save(*args, **kwargs)
-        # Remove bill creation logic from here
-        # Always set union_leader to created_by if not set
-        if not self.union_leader:
-            self.union_leader = self.created_by
-            super().save(update_fields=['union_leader'])
+        with transaction.atomic():
+            previous = None
+            if self.pk is not None:
+                previous = Expense.objects.filter(pk=self.pk).values(*ExpenseRollup.SOURCE_FIELDS).first()
+            # Always set union_leader to created_by if not set
+            if not self.union_leader_id:
+                self.union_leader_id = self.created_by_id
+                if kwargs.get('update_fields') is not None:
+                    kwargs['update_fields'] = set(kwargs['update_fields']) | {'union_leader'}
+            super().save(*args, **kwargs)
+            # Normalise raw assignments (e.g. date='2026-03-05', amount=12.5) the way the database would
+            current = {
+                field: self._meta.get_field(field).to_python(getattr(self, field))
+                for field in ExpenseRollup.SOURCE_FIELDS
+            }
+            ExpenseRollup.record_change(previous, current)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            previous = Expense.objects.filter(pk=self.pk).values(*ExpenseRollup.SOURCE_FIELDS).first()
+            ExpenseRollup.record_change(previous, None)
+            return super().delete(*args, **kwargs)
 
     def __str__(self):
         if self.is_shared:
             return f'Shared: {self.category} - {self.amount} - {self.date}'
         return f'{self.resident.user.get_full_name() if self.resident else "No Resident"} - {self.category} - {self.amount} - {self.date}'
 
+class ExpenseRollup(models.Model):
+    """Running expense totals per union leader, month, category and status.
+
+    Kept up to date by Expense.save/delete; rebuild with the
+    rebuild_expense_rollups command after bulk writes.
+    """
+    SOURCE_FIELDS = ('union_leader_id', 'date', 'category', 'status', 'amount')
+
+    union_leader = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='expense_rollups')
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    category = models.CharField(max_length=20)
+    status = models.CharField(max_length=20)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['union_leader', 'year', 'month', 'category', 'status'], name='unique_expense_rollup'),
+        ]
+
+    @classmethod
+    def _shift(cls, values, sign):
+        if not values or not values['union_leader_id']:
+            return
+        rollup, _ = cls.objects.get_or_create(
+            union_leader_id=values['union_leader_id'],
+            year=values['date'].year,
+            month=values['date'].month,
+            category=values['category'],
+            status=values['status'],
+        )
+        cls.objects.filter(pk=rollup.pk).update(
+            total=F('total') + sign * Decimal(values['amount']),
+            count=F('count') + sign,
+        )
+
+    @classmethod
+    def record_change(cls, previous, current):
+        """Move an expense's contribution from its previous values to its current ones."""
+        if previous == current:
+            return
+        cls._shift(previous, -1)
+        cls._shift(current, 1)
+
+    @classmethod
+    def rebuild(cls):
+        """Recompute every rollup row from the expense table in one grouped query."""
+        rows = Expense.objects.filter(union_leader__isnull=False).annotate(
+            year=ExtractYear('date'), month=ExtractMonth('date')
+        ).order_by().values('union_leader_id', 'year', 'month', 'category', 'status').annotate(
+            total=Sum('amount'), count=Count('id')
+        )
+        with transaction.atomic():
+            cls.objects.all().delete()
+            created = cls.objects.bulk_create([cls(**row) for row in rows], batch_size=BULK_BATCH_SIZE)
+        return len(created)
+
+    def __str__(self):
+        return f'{self.union_leader_id} - {self.year}-{self.month:02d} - {self.category} - {self.status} - {self.total}'
+
 class ResidentExpenseShare(TimeStampedModel):
     expense = models.ForeignKey(Expense, on_delete=models.CASCADE, related_name='resident_shares')
     resident = models.ForeignKey(Resident, on_delete=models.CASCADE, related_name='expense_shares')
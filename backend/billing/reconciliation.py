@@ -0,0 +1,238 @@
+"""Bank statement import and payment reconciliation.
+
+A statement (CSV or OFX) is parsed into lines, each credit line is matched
+against the union leader's open bills through in-memory dict indexes, and the
+matches are written back in bulk: pending payments that the bank confirms are
+approved, and new approved payments are created for the rest. Lines that
+cannot be matched unambiguously are returned for manual review.
+"""
+import csv
+import io
+import re
+from collections import defaultdict, namedtuple
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Bill, Payment, BULK_BATCH_SIZE
+
+StatementLine = namedtuple('StatementLine', 'line_number date amount transaction_id reference')
+
+CSV_COLUMNS = {
+    'date': ('date', 'posted', 'transaction_date', 'value_date'),
+    'amount': ('amount', 'credit', 'value'),
+    'transaction_id': ('transaction_id', 'fitid', 'reference_number', 'txn_id', 'id'),
+    'reference': ('reference', 'description', 'memo', 'narrative', 'details', 'name'),
+}
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%m/%d/%Y', '%Y%m%d', '%d-%m-%Y')
+BILL_REFERENCE = re.compile(r'\bBILL[-\s#]?(\d+)\b', re.IGNORECASE)
+OFX_TRANSACTION = re.compile(r'<STMTTRN>(.*?)(?:</STMTTRN>|(?=<STMTTRN>)|</BANKTRANLIST>)', re.IGNORECASE | re.DOTALL)
+OFX_FIELD = re.compile(r'<(\w+)>([^<\r\n]*)')
+
+
+class StatementError(ValueError):
+    pass
+
+
+def _parse_date(value):
+    # Drop any time part: '2025-05-01 10:30', '2025-05-01T10:30'
+    value = (value or '').strip().split(' ')[0].split('T')[0]
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _parse_amount(value):
+    try:
+        return Decimal((value or '').replace(',', '').strip())
+    except InvalidOperation:
+        return None
+
+
+def parse_csv(text):
+    reader = csv.DictReader(io.StringIO(text))
+    if not reader.fieldnames:
+        raise StatementError('The CSV statement has no header row')
+    # 'Transaction ID', 'transaction-id' and 'transaction_id' all name the same column
+    headers = {re.sub(r'[\s-]+', '_', name.strip().lower()): name for name in reader.fieldnames if name}
+    columns = {}
+    for field, aliases in CSV_COLUMNS.items():
+        columns[field] = next((headers[alias] for alias in aliases if alias in headers), None)
+    if not columns['amount']:
+        raise StatementError('The CSV statement needs an amount column')
+
+    lines = []
+    for line_number, row in enumerate(reader, start=2):
+        lines.append(StatementLine(
+            line_number=line_number,
+            date=_parse_date(row.get(columns['date'])) if columns['date'] else None,
+            amount=_parse_amount(row.get(columns['amount'])),
+            transaction_id=(row.get(columns['transaction_id']) or '').strip() if columns['transaction_id'] else '',
+            reference=(row.get(columns['reference']) or '').strip() if columns['reference'] else '',
+        ))
+    return lines
+
+
+def parse_ofx(text):
+    lines = []
+    for line_number, block in enumerate(OFX_TRANSACTION.findall(text), start=1):
+        fields = {tag.upper(): value.strip() for tag, value in OFX_FIELD.findall(block)}
+        lines.append(StatementLine(
+            line_number=line_number,
+            date=_parse_date(fields.get('DTPOSTED', '')[:8]),
+            amount=_parse_amount(fields.get('TRNAMT')),
+            transaction_id=fields.get('FITID', '') or fields.get('REFNUM', ''),
+            reference=' '.join(filter(None, [fields.get('NAME'), fields.get('MEMO')])),
+        ))
+    return lines
+
+
+def parse_statement(data, filename=''):
+    """Parse raw statement bytes or text; OFX is detected by extension or content."""
+    text = data.decode('utf-8-sig', errors='replace') if isinstance(data, bytes) else data
+    if filename.lower().endswith(('.ofx', '.qfx')) or '<OFX>' in text[:4096].upper():
+        return parse_ofx(text)
+    return parse_csv(text)
+
+
+def reconcile_statement(lines, union_leader, dry_run=False):
+    """Match statement lines to union_leader's open bills and record the payments.
+
+    Returns a report dict with the matched lines, the lines left for review
+    and the resulting counts.
+    """
+    open_bills = list(
+        Bill.objects.filter(union_leader=union_leader).exclude(status='paid')
+        .values('id', 'due_date', 'amount', 'penalty_amount', 'amount_paid', 'resident_id', 'resident__unit_number', 'resident__user__username')
+        .order_by('due_date', 'id')
+    )
+    known_payments = Payment.objects.filter(bill__union_leader=union_leader).exclude(transaction_id='').exclude(status='rejected')
+
+    # In-memory hash indexes over the open bills and already-submitted payments
+    bills_by_id = {bill['id']: bill for bill in open_bills}
+    for bill in open_bills:
+        bill['remaining'] = bill['amount'] + bill['penalty_amount'] - bill['amount_paid']
+    bills_by_resident_ref = defaultdict(list)
+    for bill in open_bills:
+        for ref in (bill['resident__user__username'], bill['resident__unit_number']):
+            if ref:
+                bills_by_resident_ref[ref.lower()].append(bill)
+    payments_by_transaction = {
+        payment['transaction_id']: payment
+        for payment in known_payments.values('id', 'bill_id', 'amount', 'status', 'transaction_id')
+    }
+
+    matched, review = [], []
+    approve_ids, new_payments = [], []
+    seen_transactions = set()
+
+    def flag(line, reason):
+        review.append({**line._asdict(), 'reason': reason})
+
+    for line in lines:
+        if line.amount is None:
+            flag(line, 'unreadable_amount')
+            continue
+        if line.amount <= 0:
+            flag(line, 'not_a_credit')
+            continue
+        if line.transaction_id and line.transaction_id in seen_transactions:
+            flag(line, 'duplicate_in_statement')
+            continue
+        seen_transactions.add(line.transaction_id)
+
+        # 1. A payment the resident already submitted with this transaction id
+        payment = payments_by_transaction.get(line.transaction_id) if line.transaction_id else None
+        if payment:
+            if payment['status'] == 'approved':
+                flag(line, 'already_approved')
+            elif payment['amount'] != line.amount:
+                flag(line, 'amount_mismatch')
+            else:
+                approve_ids.append(payment['id'])
+                payment['status'] = 'approved'
+                matched.append({**line._asdict(), 'bill_id': payment['bill_id'], 'payment_id': payment['id'], 'match': 'transaction_id'})
+            continue
+
+        # 2. An explicit bill reference, then 3. a resident reference with a bill of the same remaining amount
+        bill = None
+        match = None
+        reference = BILL_REFERENCE.search(line.reference)
+        if reference and int(reference.group(1)) in bills_by_id:
+            bill, match = bills_by_id[int(reference.group(1))], 'bill_reference'
+        else:
+            tokens = {token.lower() for token in re.findall(r'[\w.@-]+', line.reference)}
+            candidates = {b['id']: b for token in tokens for b in bills_by_resident_ref.get(token, ())}
+            exact = sorted(
+                (b for b in candidates.values() if b['remaining'] == line.amount),
+                key=lambda b: (b['due_date'], b['id'])
+            )
+            if len({b['resident_id'] for b in exact}) == 1:
+                # Several equal bills for one resident: settle the oldest first
+                bill, match = exact[0], 'resident_reference'
+            elif candidates:
+                flag(line, 'ambiguous_resident_match' if exact else 'no_bill_with_amount')
+                continue
+
+        if bill is None:
+            flag(line, 'no_match')
+            continue
+        if line.amount > bill['remaining']:
+            flag(line, 'exceeds_remaining_balance')
+            continue
+
+        bill['remaining'] -= line.amount
+        new_payments.append(Payment(
+            bill_id=bill['id'],
+            amount=line.amount,
+            payment_date=line.date or timezone.now().date(),
+            payment_method='bank_transfer',
+            transaction_id=line.transaction_id,
+            notes=f'Imported from bank statement: {line.reference}'[:1000],
+            status='approved',
+        ))
+        matched.append({**line._asdict(), 'bill_id': bill['id'], 'payment_id': None, 'match': match})
+
+    if not dry_run and (approve_ids or new_payments):
+        _record_payments(approve_ids, new_payments)
+
+    return {
+        'dry_run': dry_run,
+        'lines': len(lines),
+        'matched': matched,
+        'review': review,
+        'payments_approved': len(approve_ids),
+        'payments_created': len(new_payments),
+    }
+
+
+@transaction.atomic
+def _record_payments(approve_ids, new_payments):
+    """Approve and insert payments in bulk and move the bill balances to match.
+
+    Payment.save is bypassed, so the amount_paid/amount_approved deltas are
+    applied here on bills locked in primary-key order.
+    """
+    to_approve = list(Payment.objects.select_for_update().filter(pk__in=approve_ids).exclude(status='approved'))
+    bill_ids = {payment.bill_id for payment in to_approve} | {payment.bill_id for payment in new_payments}
+    bills = {bill.pk: bill for bill in Bill.objects.select_for_update().filter(pk__in=bill_ids).order_by('pk')}
+
+    now = timezone.now()
+    for payment in to_approve:
+        bills[payment.bill_id].amount_approved += payment.amount
+    Payment.objects.filter(pk__in=[payment.pk for payment in to_approve]).update(status='approved', updated_at=now)
+
+    for payment in new_payments:
+        bills[payment.bill_id].amount_paid += payment.amount
+        bills[payment.bill_id].amount_approved += payment.amount
+    Payment.objects.bulk_create(new_payments, batch_size=BULK_BATCH_SIZE)
+
+    for bill in bills.values():
+        bill.settle_status()
+        bill.updated_at = now
+    Bill.objects.bulk_update(bills.values(), ['amount_paid', 'amount_approved', 'status', 'updated_at'], batch_size=BULK_BATCH_SIZE)
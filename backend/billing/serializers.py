@@ -1,7 +1,11 @@
 from rest_framework import serializers
 from django.utils import timezone
-from .models import Bill, Payment, SharedBill, Expense, ResidentExpenseShare
+from .models import (
+    Bill, Payment, SharedBill, Expense, ResidentExpenseShare, RecurringBillTemplate, UtilityTariff, MeterReading,
+    LateFeePolicy
+)
 from django.contrib.auth import get_user_model
+from .allocation import validate_custom_weights
 
 User = get_user_model()
 from residents.serializers import ResidentSerializer
@@ -26,24 +30,23 @@ class BillSerializer(serializers.ModelSerializer):
     class Meta:
         model = Bill
         fields = '__all__'
-        read_only_fields = ('created_at', 'updated_at')
+        read_only_fields = ('created_at', 'updated_at', 'amount_paid', 'amount_approved')
     
     def get_total_paid(self, obj):
-        return sum(payment.amount for payment in obj.payments.all())
+        return obj.amount_paid
     
     def get_remaining_amount(self, obj):
-        total_paid = self.get_total_paid(obj)
-        return float(obj.amount) - float(total_paid)
+        return float(obj.remaining_amount)
     
     def get_original_amount(self, obj):
-        # The original amount is the current amount minus the penalty (if any)
-        return float(obj.amount) - float(obj.penalty_amount or 0)
+        # Late fees live in penalty_amount, so amount is the original charge
+        return float(obj.amount)
     
     def get_penalty_amount(self, obj):
         return float(obj.penalty_amount or 0)
     
     def get_total_due(self, obj):
-        return float(obj.amount)
+        return float(obj.total_due)
 
 class BillCreateSerializer(serializers.ModelSerializer):
     screenshot = serializers.ImageField(required=False, allow_null=True)
@@ -52,19 +55,106 @@ class BillCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Bill
         fields = '__all__'
-        read_only_fields = ('created_at', 'updated_at', 'status')
+        read_only_fields = ('created_at', 'updated_at', 'status', 'amount_paid', 'amount_approved', 'recurring_template', 'period')
         
     def validate_payment_screenshot(self, value):
         if value and not self.initial_data.get('payment_date'):
             raise serializers.ValidationError('Payment date is required when uploading a payment screenshot')
         return value
 
+def validate_allocation(attrs, user):
+    """Check that custom allocation weights name only the user's active residents."""
+    if attrs.get('allocation_method') != 'custom':
+        attrs.pop('allocation_weights', None)
+        return attrs
+    weights = attrs.get('allocation_weights')
+    error = validate_custom_weights(weights)
+    if error:
+        raise serializers.ValidationError({'allocation_weights': error})
+    from residents.models import Resident
+    resident_ids = {int(resident_id) for resident_id in weights}
+    if Resident.objects.filter(union_leader=user, is_active=True, pk__in=resident_ids).count() != len(resident_ids):
+        raise serializers.ValidationError({'allocation_weights': 'Custom weights may only name your active residents'})
+    return attrs
+
 class SharedBillCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = SharedBill
-        fields = ['amount', 'due_date', 'bill_type', 'description']
+        fields = ['amount', 'due_date', 'bill_type', 'description', 'allocation_method', 'allocation_weights']
         read_only_fields = ('created_at', 'updated_at')
 
+    def validate(self, attrs):
+        return validate_allocation(attrs, self.context['request'].user)
+
+class RecurringBillTemplateSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RecurringBillTemplate
+        fields = '__all__'
+        read_only_fields = ('created_at', 'updated_at', 'union_leader')
+
+    def validate_residents(self, value):
+        user = self.context['request'].user
+        if any(resident.union_leader_id != user.pk for resident in value):
+            raise serializers.ValidationError('Residents must belong to your union')
+        return value
+
+    def validate(self, data):
+        target = data.get('target', getattr(self.instance, 'target', 'all'))
+        if target == 'block' and not data.get('target_block', getattr(self.instance, 'target_block', '')):
+            raise serializers.ValidationError({'target_block': 'A block is required when targeting a block'})
+        end_date = data.get('end_date', getattr(self.instance, 'end_date', None))
+        start_date = data.get('start_date', getattr(self.instance, 'start_date', None))
+        if end_date and start_date and end_date < start_date:
+            raise serializers.ValidationError({'end_date': 'End date must be after the start date'})
+        return data
+
+class LateFeePolicySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = LateFeePolicy
+        fields = '__all__'
+        read_only_fields = ('created_at', 'updated_at', 'union_leader')
+        extra_kwargs = {'bill_type': {'required': False}}
+
+    def validate(self, data):
+        for field in ('amount', 'rate', 'cap'):
+            if (data.get(field) or 0) < 0:
+                raise serializers.ValidationError({field: 'Must not be negative'})
+        bill_type = data.get('bill_type', getattr(self.instance, 'bill_type', ''))
+        existing = LateFeePolicy.objects.filter(union_leader=self.context['request'].user, bill_type=bill_type)
+        if self.instance is not None:
+            existing = existing.exclude(pk=self.instance.pk)
+        if existing.exists():
+            raise serializers.ValidationError({'bill_type': 'You already have a policy for this bill type'})
+        return data
+
+class UtilityTariffSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UtilityTariff
+        fields = '__all__'
+        read_only_fields = ('created_at', 'updated_at', 'union_leader')
+
+    def validate_slabs(self, value):
+        error = UtilityTariff.validate_slabs(value)
+        if error:
+            raise serializers.ValidationError(error)
+        return value
+
+    def validate(self, data):
+        utility = data.get('utility', getattr(self.instance, 'utility', None))
+        existing = UtilityTariff.objects.filter(union_leader=self.context['request'].user, utility=utility)
+        if self.instance is not None:
+            existing = existing.exclude(pk=self.instance.pk)
+        if existing.exists():
+            raise serializers.ValidationError({'utility': 'You already have a tariff for this utility'})
+        return data
+
+class MeterReadingSerializer(serializers.ModelSerializer):
+    home_label = serializers.CharField(source='home', read_only=True)
+
+    class Meta:
+        model = MeterReading
+        fields = '__all__'
+
 class PaymentSerializer(serializers.ModelSerializer):
     bill = BillSerializer(read_only=True)
     
@@ -73,6 +163,22 @@ class PaymentSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ('created_at', 'updated_at')
 
+class PaymentListSerializer(serializers.ModelSerializer):
+    """Flat payment row for lists; PaymentSerializer keeps the nested bill for ?expand=bill."""
+    bill_type = serializers.CharField(source='bill.bill_type', read_only=True)
+    bill_amount = serializers.DecimalField(source='bill.amount', max_digits=10, decimal_places=2, read_only=True)
+    bill_due_date = serializers.DateField(source='bill.due_date', read_only=True)
+    bill_status = serializers.CharField(source='bill.status', read_only=True)
+    resident_id = serializers.IntegerField(source='bill.resident_id', read_only=True)
+    resident_name = serializers.CharField(source='bill.resident.user.get_full_name', read_only=True)
+    unit_number = serializers.CharField(source='bill.resident.unit_number', read_only=True)
+    home = serializers.CharField(source='bill.resident.home', read_only=True)
+
+    class Meta:
+        model = Payment
+        fields = '__all__'
+        read_only_fields = ('created_at', 'updated_at')
+
 class PaymentCreateSerializer(serializers.ModelSerializer):
     screenshot = serializers.ImageField(required=False, allow_null=True)
     payment_date = serializers.DateField(required=False)
@@ -109,14 +215,14 @@ class PaymentCreateSerializer(serializers.ModelSerializer):
         validated_data['status'] = 'pending'
         payment = super().create(validated_data)
         bill = payment.bill
+        bill.refresh_from_db(fields=['amount_paid', 'amount_approved', 'penalty_amount'])
         
-        # Update bill status based on payments
-        total_paid = sum(payment.amount for payment in bill.payments.all())
-        if total_paid >= bill.amount:
+        # Update bill status based on payments; late fees must be covered too
+        if bill.amount_paid >= bill.total_due:
             bill.status = 'paid'
-        elif total_paid > 0:
+        elif bill.amount_paid > 0:
             bill.status = 'pending'
-        bill.save()
+        bill.save(update_fields=['status', 'updated_at'])
         
         return payment
     
@@ -139,8 +245,7 @@ class PaymentCreateSerializer(serializers.ModelSerializer):
             attrs['payment_date'] = timezone.now().date()
         
         if bill and amount:
-            total_paid = sum(payment.amount for payment in bill.payments.all())
-            remaining = bill.amount - total_paid
+            remaining = bill.remaining_amount
             
             if amount > remaining:
                 raise serializers.ValidationError({
@@ -196,10 +301,16 @@ class ExpenseSerializer(serializers.ModelSerializer):
     def get_resident_name(self, obj):
         return obj.resident.user.get_full_name() if obj.resident else None
 
+class ExpenseShareSummarySerializer(ExpenseSerializer):
+    """ExpenseSerializer with share count and total in place of every share row."""
+    resident_shares = None
+    share_count = serializers.IntegerField(read_only=True)
+    share_total = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+
 class ExpenseCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Expense
-        fields = ('amount', 'date', 'category', 'description', 'receipt', 'resident', 'is_shared')
+        fields = ('amount', 'date', 'category', 'description', 'receipt', 'resident', 'is_shared', 'allocation_method', 'allocation_weights')
         read_only_fields = ('created_at', 'updated_at', 'status', 'approved_by', 'created_by', 'share_distributed')
 
     def create(self, validated_data):
@@ -227,6 +338,7 @@ class ExpenseCreateSerializer(serializers.ModelSerializer):
         user = self.context['request'].user
         resident = attrs.get('resident')
         is_shared = attrs.get('is_shared', False)
+        validate_allocation(attrs, user)
 
         # If it's a shared expense, only admins can create it
         if is_shared and not user.is_staff:
@@ -0,0 +1,104 @@
+"""Resident account statements computed in SQL.
+
+Bills and late fees (debits) and approved payments (credits) are combined with UNION ALL
+and a SUM() window function carries the running balance, so the database
+returns the ledger already ordered and balanced.
+"""
+from decimal import Decimal
+
+from django.db import connection
+from django.utils.dateparse import parse_date
+
+from .models import Bill, Payment, PenaltyEntry
+
+CENT = Decimal('0.01')
+# Number of resident_id placeholders in _ledger_sql()
+LEDGER_PARAMS = 3
+COLUMNS = ('entry_date', 'entry_type', 'reference_id', 'bill_id', 'description', 'reference', 'debit', 'credit', 'balance')
+
+
+def _money(value):
+    return Decimal(str(value or 0)).quantize(CENT)
+
+
+def _ledger_sql():
+    bill_table = connection.ops.quote_name(Bill._meta.db_table)
+    payment_table = connection.ops.quote_name(Payment._meta.db_table)
+    penalty_table = connection.ops.quote_name(PenaltyEntry._meta.db_table)
+    # sort_order puts a day's bills, then late fees, before that day's payments
+    return f"""
+        SELECT b.due_date AS entry_date, 'bill' AS entry_type, 0 AS sort_order, b.id AS reference_id,
+               b.id AS bill_id, b.bill_type AS description, '' AS reference,
+               b.amount AS debit, 0 AS credit
+        FROM {bill_table} b
+        WHERE b.resident_id = %s
+        UNION ALL
+        SELECT pe.entry_date, 'penalty', 1, pe.id,
+               pe.bill_id, pe.entry_type, '',
+               CASE WHEN pe.amount > 0 THEN pe.amount ELSE 0 END,
+               CASE WHEN pe.amount < 0 THEN -pe.amount ELSE 0 END
+        FROM {penalty_table} pe
+        INNER JOIN {bill_table} b ON b.id = pe.bill_id
+        WHERE b.resident_id = %s
+        UNION ALL
+        SELECT p.payment_date, 'payment', 2, p.id,
+               p.bill_id, p.payment_method, p.transaction_id,
+               0, p.amount
+        FROM {payment_table} p
+        INNER JOIN {bill_table} b ON b.id = p.bill_id
+        WHERE b.resident_id = %s AND p.status = 'approved'
+    """
+
+
+def statement_rows(resident_id, start_date=None, end_date=None):
+    """Yield ledger rows (dicts keyed by COLUMNS) between start_date and end_date.
+
+    The running balance covers all history up to each row, so rows before
+    start_date still count towards it without being returned. Rows are
+    fetched in chunks from the cursor so large statements can be streamed.
+    """
+    params = [resident_id] * LEDGER_PARAMS
+    upper = ''
+    if end_date:
+        upper = 'WHERE entry_date <= %s'
+        params.append(end_date.isoformat())
+    lower = ''
+    if start_date:
+        lower = 'WHERE entry_date >= %s'
+        params.append(start_date.isoformat())
+    sql = f"""
+        SELECT {', '.join(COLUMNS)} FROM (
+            SELECT ledger.*, SUM(debit - credit) OVER (
+                ORDER BY entry_date, sort_order, reference_id
+                ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW
+            ) AS balance
+            FROM ({_ledger_sql()}) ledger
+            {upper}
+        ) statement
+        {lower}
+        ORDER BY entry_date, sort_order, reference_id
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        while True:
+            chunk = cursor.fetchmany(1000)
+            if not chunk:
+                break
+            for row in chunk:
+                entry = dict(zip(COLUMNS, row))
+                if isinstance(entry['entry_date'], str):
+                    entry['entry_date'] = parse_date(entry['entry_date'])
+                for field in ('debit', 'credit', 'balance'):
+                    entry[field] = _money(entry[field])
+                yield entry
+
+
+def balance_as_of(resident_id, as_of, inclusive=True):
+    """Return the resident's balance (bills minus approved payments) on a date, in one query."""
+    comparison = '<=' if inclusive else '<'
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT SUM(debit - credit) FROM ({_ledger_sql()}) ledger WHERE entry_date {comparison} %s',
+            [resident_id] * LEDGER_PARAMS + [as_of.isoformat()]
+        )
+        return _money(cursor.fetchone()[0])
@@ -1,3 +1,692 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from importlib import import_module
+from unittest import mock
+
+from django.apps import apps
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.models import User
+from homes.models import Home
+from residents.models import Resident
+from .allocation import AllocationError, allocate
+from .meters import bill_readings, parse_readings, slab_charges
+from .models import (
+    Bill, Expense, ExpenseRollup, IdempotencyKey, LateFeePolicy, MeterReading, Payment, PenaltyEntry, PenaltyRun,
+    RecurringBillTemplate, SharedBill, UtilityTariff,
+)
+from .reconciliation import parse_statement, reconcile_statement
+
+
+def make_leader(username='leader'):
+    return User.objects.create_user(username=username, password='x', is_staff=True, role='admin')
+
+
+def make_residents(leader, count=3):
+    residents = []
+    for i in range(count):
+        home = Home.objects.create(
+            number=str(i), floor=1, block='A', rent=Decimal('1000'), bedrooms=1 + i,
+            bathrooms=1, area=Decimal(500 + 100 * i), status='occupied',
+        )
+        user = User.objects.create_user(username=f'{leader.username}-resident{i}', password='x')
+        residents.append(Resident.objects.create(
+            user=user, home=home, unit_number=str(i), lease_start_date=date(2026, 1, 1),
+            lease_end_date=date(2026, 12, 31), emergency_contact_name='Contact',
+            emergency_contact_phone='555', union_leader=leader,
+        ))
+    return residents
+
+
+class ExpenseRollupTests(TestCase):
+    def test_raw_date_and_amount_values_are_normalised(self):
+        leader = make_leader()
+        expense = Expense.objects.create(
+            amount=12.5, date='2026-03-05', category='maintenance', created_by=leader, is_shared=False,
+        )
+        rollup = ExpenseRollup.objects.get(union_leader=leader)
+        self.assertEqual((rollup.year, rollup.month, rollup.total, rollup.count), (2026, 3, Decimal('12.50'), 1))
+
+        expense.amount = '20.00'
+        expense.save()
+        rollup.refresh_from_db()
+        self.assertEqual((rollup.total, rollup.count), (Decimal('20.00'), 1))
+
+
+class StatementViewTests(TestCase):
+    def setUp(self):
+        self.leader = make_leader()
+        self.resident, self.neighbour = make_residents(self.leader, 2)
+        self.client = APIClient()
+        self.client.force_authenticate(self.leader)
+
+        bill = Bill.objects.create(
+            resident=self.resident, amount=Decimal('100.00'), due_date=date(2026, 1, 1), bill_type='rent',
+            union_leader=self.leader,
+        )
+        Payment.objects.create(
+            bill=bill, amount=Decimal('40.00'), payment_date=date(2026, 1, 1), payment_method='cash', status='approved',
+        )
+        PenaltyEntry.objects.create(bill=bill, entry_type='accrual', amount=Decimal('10.00'), entry_date=date(2026, 1, 15))
+        PenaltyEntry.objects.create(bill=bill, entry_type='waiver', amount=Decimal('-10.00'), entry_date=date(2026, 1, 20))
+        later = Bill.objects.create(
+            resident=self.resident, amount=Decimal('50.00'), due_date=date(2026, 2, 1), bill_type='utilities',
+            union_leader=self.leader,
+        )
+        # Pending payments are not on the statement until approved
+        Payment.objects.create(bill=later, amount=Decimal('50.00'), payment_date=date(2026, 2, 5), payment_method='cash')
+
+    def statement(self, **params):
+        response = self.client.get('/api/billing/statement/', {'resident': self.resident.pk, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_resident_must_be_an_id(self):
+        for value in ('abc', ''):
+            response = self.client.get('/api/billing/statement/', {'resident': value})
+            self.assertEqual(response.status_code, 400)
+
+    def test_unknown_resident_is_not_found(self):
+        response = self.client.get('/api/billing/statement/', {'resident': self.resident.pk + 100})
+        self.assertEqual(response.status_code, 404)
+
+    def test_ledger_order_and_running_balance(self):
+        data = self.statement()
+        self.assertEqual(
+            [(entry['entry_date'], entry['entry_type'], entry['debit'], entry['credit'], entry['balance']) for entry in data['entries']],
+            [
+                (date(2026, 1, 1), 'bill', Decimal('100.00'), Decimal('0.00'), Decimal('100.00')),
+                (date(2026, 1, 1), 'payment', Decimal('0.00'), Decimal('40.00'), Decimal('60.00')),
+                (date(2026, 1, 15), 'penalty', Decimal('10.00'), Decimal('0.00'), Decimal('70.00')),
+                (date(2026, 1, 20), 'penalty', Decimal('0.00'), Decimal('10.00'), Decimal('60.00')),
+                (date(2026, 2, 1), 'bill', Decimal('50.00'), Decimal('0.00'), Decimal('110.00')),
+            ]
+        )
+        self.assertEqual((data['opening_balance'], data['closing_balance']), (Decimal('0.00'), Decimal('110.00')))
+
+    def test_date_range_keeps_earlier_history_in_the_balance(self):
+        data = self.statement(start_date='2026-01-10', end_date='2026-01-31')
+        self.assertEqual([entry['description'] for entry in data['entries']], ['accrual', 'waiver'])
+        self.assertEqual((data['opening_balance'], data['closing_balance']), (Decimal('60.00'), Decimal('60.00')))
+        self.assertEqual((data['total_debits'], data['total_credits']), (Decimal('10.00'), Decimal('10.00')))
+
+        data = self.statement(start_date='2026-03-01')
+        self.assertEqual((data['entries'], data['opening_balance'], data['closing_balance']), ([], Decimal('110.00'), Decimal('110.00')))
+
+    def test_balance_as_of(self):
+        self.assertEqual(self.statement(as_of='2026-01-15')['balance'], Decimal('70.00'))
+        self.assertEqual(self.statement(as_of='2025-12-31')['balance'], Decimal('0.00'))
+
+    def test_residents_only_read_their_own_statement(self):
+        client = APIClient()
+        client.force_authenticate(self.neighbour.user)
+        response = client.get('/api/billing/statement/', {'resident': self.resident.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['resident'], response.data['entries']), (self.neighbour.pk, []))
+
+        client.force_authenticate(make_leader('other-leader'))
+        response = client.get('/api/billing/statement/', {'resident': self.resident.pk})
+        self.assertEqual(response.status_code, 404)
+
+class BillBatchTests(TestCase):
+    def setUp(self):
+        self.leader = make_leader()
+        self.residents = make_residents(self.leader, 2)
+        self.client = APIClient()
+        self.client.force_authenticate(self.leader)
+
+    def make_bill(self, resident, amount='100.00', due_date=date(2026, 1, 1)):
+        return Bill.objects.create(
+            resident=resident, amount=Decimal(amount), due_date=due_date, bill_type='maintenance',
+            union_leader=self.leader,
+        )
+
+    def test_non_scalar_filter_value_is_rejected(self):
+        response = self.client.post('/api/billing/bills/batch_mark_paid/', {'filter': {'resident': {'a': 1}}}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_boolean_ids_and_filter_values_are_rejected(self):
+        bill = self.make_bill(self.residents[0])
+        for body in ({'ids': [True]}, {'ids': [bill.pk, False]}, {'filter': {'resident': True}}):
+            response = self.client.post('/api/billing/bills/batch_mark_paid/', body, format='json')
+            self.assertEqual(response.status_code, 400)
+        bill.refresh_from_db()
+        self.assertEqual(bill.status, 'pending')
+
+    def test_delete_keeps_bills_with_pending_payments(self):
+        paid, unpaid = self.make_bill(self.residents[0]), self.make_bill(self.residents[1])
+        Payment.objects.create(bill=paid, amount=Decimal('40.00'), payment_date=date(2026, 1, 5), payment_method='cash')
+
+        response = self.client.post('/api/billing/bills/batch_delete/', {'ids': [paid.pk, unpaid.pk]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], {paid.pk: 'has_pending_payments', unpaid.pk: 'updated'})
+        self.assertTrue(Payment.objects.filter(bill=paid).exists())
+        self.assertFalse(Bill.objects.filter(pk=unpaid.pk).exists())
+
+    def test_waived_penalty_is_not_accrued_again(self):
+        LateFeePolicy.objects.create(union_leader=self.leader, fee_type='flat', amount=Decimal('10.00'))
+        bill = self.make_bill(self.residents[0])
+        PenaltyRun.run(date(2026, 2, 1))
+        bill.refresh_from_db()
+        self.assertEqual(bill.penalty_amount, Decimal('10.00'))
+
+        response = self.client.post('/api/billing/bills/batch_waive_penalty/', {'ids': [bill.pk]}, format='json')
+        self.assertEqual(response.data['results'], {bill.pk: 'updated'})
+        PenaltyRun.run(date(2026, 3, 1))
+        bill.refresh_from_db()
+        self.assertEqual((bill.penalty_amount, bill.penalty_waived), (Decimal('0.00'), True))
+        self.assertEqual(list(bill.penalty_entries.values_list('entry_type', flat=True).order_by('pk')), ['accrual', 'waiver'])
+
+
+class BillBalanceTests(TestCase):
+    def setUp(self):
+        self.leader = make_leader()
+        self.resident = make_residents(self.leader, 1)[0]
+        self.bills = [
+            Bill.objects.create(
+                resident=self.resident, amount=Decimal('100.00'), due_date=date(2026, 1, 1), bill_type='rent',
+                union_leader=self.leader,
+            )
+            for _ in range(2)
+        ]
+
+    def pay(self, bill, amount, status='pending'):
+        return Payment.objects.create(
+            bill=bill, amount=Decimal(amount), payment_date=date(2026, 1, 5), payment_method='cash', status=status,
+        )
+
+    def assertBalancesMatchPayments(self):
+        for bill in Bill.objects.with_computed_balances():
+            self.assertEqual((bill.amount_paid, bill.amount_approved), (bill.computed_paid, bill.computed_approved))
+
+    def test_payment_lifecycle_keeps_the_bill_columns_in_step(self):
+        first, second = self.bills
+        pending = self.pay(first, '30.00')
+        approved = self.pay(first, '20.00', 'approved')
+        self.assertBalancesMatchPayments()
+        first.refresh_from_db()
+        self.assertEqual((first.amount_paid, first.amount_approved), (Decimal('50.00'), Decimal('20.00')))
+
+        pending.status = 'approved'
+        pending.save()
+        self.assertBalancesMatchPayments()
+
+        approved.status = 'rejected'
+        approved.save()
+        self.assertBalancesMatchPayments()
+
+        # Moving a payment to another bill shifts it between both bills
+        pending.bill = second
+        pending.amount = Decimal('35.00')
+        pending.save()
+        self.assertBalancesMatchPayments()
+
+        pending.delete()
+        approved.delete()
+        self.assertBalancesMatchPayments()
+        first.refresh_from_db()
+        self.assertEqual((first.amount_paid, first.amount_approved), (Decimal('0.00'), Decimal('0.00')))
+
+    def test_backfill_migration(self):
+        self.pay(self.bills[0], '30.00')
+        self.pay(self.bills[0], '20.00', 'approved')
+        self.pay(self.bills[1], '15.00', 'rejected')
+        Bill.objects.update(amount_paid=Decimal('999.00'), amount_approved=Decimal('999.00'))
+
+        migration = import_module('billing.migrations.0017_bill_amount_paid_bill_amount_approved')
+        migration.backfill_balances(apps, None)
+        self.assertBalancesMatchPayments()
+        self.assertEqual(
+            list(Bill.objects.order_by('pk').values_list('amount_paid', 'amount_approved')),
+            [(Decimal('50.00'), Decimal('20.00')), (Decimal('0.00'), Decimal('0.00'))]
+        )
+
+
+class BulkApproveTests(TestCase):
+    def test_approves_payments_across_bills(self):
+        leader = make_leader()
+        resident = make_residents(leader, 1)[0]
+        first, second = [
+            Bill.objects.create(
+                resident=resident, amount=Decimal('100.00'), due_date=date(2026, 1, 1), bill_type='rent',
+                union_leader=leader,
+            )
+            for _ in range(2)
+        ]
+
+        def pay(bill, amount, status='pending'):
+            return Payment.objects.create(
+                bill=bill, amount=Decimal(amount), payment_date=date(2026, 1, 5), payment_method='cash', status=status,
+            ).pk
+
+        ids = [pay(first, '60.00'), pay(first, '40.00'), pay(second, '30.00'), pay(second, '10.00', 'rejected')]
+        already = pay(second, '20.00', 'approved')
+        client = APIClient()
+        client.force_authenticate(leader)
+
+        response = client.post('/api/billing/payments/bulk_approve/', {'ids': ids + [already, 9999]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['approved'], sorted(ids))
+        self.assertEqual(response.data['skipped'], {already: 'already_approved', 9999: 'not_found'})
+        self.assertFalse(Payment.objects.exclude(status='approved').exists())
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.amount_paid, first.amount_approved, first.status), (Decimal('100.00'), Decimal('100.00'), 'paid'))
+        self.assertEqual(
+            (second.amount_paid, second.amount_approved, second.status),
+            (Decimal('60.00'), Decimal('60.00'), 'partially_paid')
+        )
+
+    def test_boolean_ids_are_rejected(self):
+        client = APIClient()
+        client.force_authenticate(make_leader())
+        response = client.post('/api/billing/payments/bulk_approve/', {'ids': [True]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class PaymentCreateTests(TestCase):
+    def setUp(self):
+        self.leader = make_leader()
+        self.resident = make_residents(self.leader, 1)[0]
+        self.client = APIClient()
+        self.client.force_authenticate(self.resident.user)
+        self.bill = Bill.objects.create(
+            resident=self.resident, amount=Decimal('100.00'), penalty_amount=Decimal('10.00'),
+            due_date=date(2026, 1, 1), bill_type='rent', union_leader=self.leader,
+        )
+
+    def pay(self, amount):
+        response = self.client.post('/api/billing/payments/', {
+            'bill': self.bill.pk, 'amount': amount, 'payment_date': '2026-02-01', 'payment_method': 'cash',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.bill.refresh_from_db()
+
+    def test_paying_the_amount_without_the_late_fee_leaves_the_bill_open(self):
+        self.pay('100.00')
+        self.assertEqual(self.bill.status, 'pending')
+        self.pay('10.00')
+        self.assertEqual(self.bill.status, 'paid')
+
+
+class IdempotentPaymentTests(TestCase):
+    def setUp(self):
+        self.leader = make_leader()
+        self.resident = make_residents(self.leader, 1)[0]
+        self.client = APIClient()
+        self.client.force_authenticate(self.resident.user)
+        self.bill = Bill.objects.create(
+            resident=self.resident, amount=Decimal('100.00'), due_date=date(2026, 1, 1), bill_type='rent',
+            union_leader=self.leader,
+        )
+        self.data = {'bill': self.bill.pk, 'amount': '40.00', 'payment_date': '2026-02-01', 'payment_method': 'cash'}
+
+    def pay(self, data=None, key='key-1'):
+        return self.client.post('/api/billing/payments/', data or self.data, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_the_first_response(self):
+        first = self.pay()
+        self.assertEqual(first.status_code, 201)
+        retry = self.pay()
+        self.assertEqual((retry.status_code, retry['Idempotent-Replayed']), (201, 'true'))
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(Payment.objects.count(), 1)
+        self.bill.refresh_from_db()
+        self.assertEqual(self.bill.amount_paid, Decimal('40.00'))
+
+    def test_request_in_flight_gets_409(self):
+        IdempotencyKey.reserve(self.resident.user, 'payments.create', 'key-1', IdempotencyKey.fingerprint(self.data))
+        self.assertEqual(self.pay().status_code, 409)
+        self.assertFalse(Payment.objects.exists())
+
+    def test_lapsed_reservation_is_taken_over(self):
+        record, _ = IdempotencyKey.reserve(
+            self.resident.user, 'payments.create', 'key-1', IdempotencyKey.fingerprint(self.data)
+        )
+        IdempotencyKey.objects.filter(pk=record.pk).update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.pay().status_code, 201)
+        self.assertEqual(Payment.objects.count(), 1)
+
+    def test_key_reused_with_a_different_body_gets_422(self):
+        self.assertEqual(self.pay().status_code, 201)
+        response = self.pay({**self.data, 'amount': '60.00'})
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Payment.objects.count(), 1)
+
+    def test_expired_key_creates_a_new_payment(self):
+        self.assertEqual(self.pay().status_code, 201)
+        record = IdempotencyKey.objects.get()
+        self.assertGreater(record.expires_at, timezone.now() + timedelta(hours=23))
+        IdempotencyKey.objects.filter(pk=record.pk).update(expires_at=timezone.now() - timedelta(seconds=1))
+        response = self.pay()
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(response.has_header('Idempotent-Replayed'))
+        self.assertEqual(Payment.objects.count(), 2)
+
+    def test_failed_attempt_releases_the_key(self):
+        self.assertEqual(self.pay({**self.data, 'amount': '-1'}).status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+
+class ReconciliationTests(TestCase):
+    def setUp(self):
+        self.leader = make_leader()
+        self.residents = make_residents(self.leader, 2)
+
+    def make_bill(self, resident, due_date=date(2026, 1, 1), amount='100.00'):
+        return Bill.objects.create(
+            resident=resident, amount=Decimal(amount), due_date=due_date, bill_type='rent', union_leader=self.leader,
+        )
+
+    def reconcile(self, *rows, dry_run=False):
+        text = 'date,amount,transaction_id,reference\n' + ''.join(f'2026-02-01,{row}\n' for row in rows)
+        return reconcile_statement(parse_statement(text), self.leader, dry_run=dry_run)
+
+    def assertBalances(self, bill, amount_paid, amount_approved, status):
+        bill.refresh_from_db()
+        self.assertEqual((bill.amount_paid, bill.amount_approved, bill.status), (Decimal(amount_paid), Decimal(amount_approved), status))
+
+    def test_transaction_id_approves_the_pending_payment(self):
+        bill = self.make_bill(self.residents[0])
+        payment = Payment.objects.create(
+            bill=bill, amount=Decimal('40.00'), payment_date=date(2026, 1, 30), payment_method='bank_transfer',
+            transaction_id='TX1',
+        )
+        report = self.reconcile('40.00,TX1,transfer')
+        self.assertEqual((report['payments_approved'], report['payments_created']), (1, 0))
+        self.assertEqual(report['matched'][0]['match'], 'transaction_id')
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'approved')
+        self.assertBalances(bill, '40.00', '40.00', 'partially_paid')
+
+    def test_bill_reference(self):
+        bill = self.make_bill(self.residents[0])
+        report = self.reconcile(f'100.00,TX2,Payment for BILL-{bill.pk}')
+        self.assertEqual([line['match'] for line in report['matched']], ['bill_reference'])
+        self.assertEqual(Payment.objects.get().status, 'approved')
+        self.assertBalances(bill, '100.00', '100.00', 'paid')
+
+    def test_resident_reference_settles_the_oldest_bill_first(self):
+        newer = self.make_bill(self.residents[0], due_date=date(2026, 2, 1))
+        older = self.make_bill(self.residents[0], due_date=date(2026, 1, 1))
+        report = self.reconcile(f'100.00,TX3,{self.residents[0].user.username} rent')
+        self.assertEqual([(line['match'], line['bill_id']) for line in report['matched']], [('resident_reference', older.pk)])
+        self.assertBalances(older, '100.00', '100.00', 'paid')
+        self.assertBalances(newer, '0.00', '0.00', 'pending')
+
+    def test_ambiguous_and_unmatched_lines_go_to_review(self):
+        for resident in self.residents:
+            self.make_bill(resident)
+        names = ' '.join(resident.user.username for resident in self.residents)
+        report = self.reconcile(f'100.00,TX4,{names}', '100.00,TX5,unknown payer', '55.00,TX6,' + names)
+        self.assertEqual(
+            [line['reason'] for line in report['review']],
+            ['ambiguous_resident_match', 'no_match', 'no_bill_with_amount']
+        )
+        self.assertFalse(Payment.objects.exists())
+
+    def test_dry_run_writes_nothing(self):
+        bill = self.make_bill(self.residents[0])
+        report = self.reconcile(f'100.00,TX7,BILL-{bill.pk}', dry_run=True)
+        self.assertEqual((report['dry_run'], report['payments_created']), (True, 1))
+        self.assertFalse(Payment.objects.exists())
+        self.assertBalances(bill, '0.00', '0.00', 'pending')
+
+
+class PenaltyRunDefaultPolicyTests(TestCase):
+    def setUp(self):
+        self.leader = make_leader()
+        self.resident = make_residents(self.leader, 1)[0]
+
+    def make_bill(self, union_leader):
+        return Bill.objects.create(
+            resident=self.resident, amount=Decimal('200.00'), due_date=date(2026, 1, 1), bill_type='rent',
+            union_leader=union_leader,
+        )
+
+    def test_default_policy_covers_leaders_without_policies_and_unowned_bills(self):
+        bills = [self.make_bill(self.leader), self.make_bill(None)]
+        run = PenaltyRun.run(date(2026, 2, 1))
+        self.assertEqual((run.bills_penalized, run.total_penalty), (2, Decimal('40.00')))
+        for bill in bills:
+            bill.refresh_from_db()
+            self.assertEqual(bill.penalty_amount, Decimal('20.00'))
+
+    def test_inactive_policy_turns_late_fees_off(self):
+        LateFeePolicy.objects.create(union_leader=self.leader, is_active=False)
+        bill = self.make_bill(self.leader)
+        PenaltyRun.run(date(2026, 2, 1))
+        bill.refresh_from_db()
+        self.assertEqual(bill.penalty_amount, Decimal('0.00'))
+
+    def test_leaders_manage_their_policies_through_the_api(self):
+        client = APIClient()
+        client.force_authenticate(self.leader)
+        data = {'fee_type': 'flat', 'amount': '15.00'}
+        response = client.post('/api/billing/late-fee-policies/', data, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['union_leader'], self.leader.pk)
+        self.assertEqual(client.post('/api/billing/late-fee-policies/', data, format='json').status_code, 400)
+
+        bill = self.make_bill(self.leader)
+        PenaltyRun.run(date(2026, 2, 1))
+        bill.refresh_from_db()
+        self.assertEqual(bill.penalty_amount, Decimal('15.00'))
+
+
+class LateFeePolicyTests(TestCase):
+    def penalty(self, days_late, **policy):
+        return LateFeePolicy(**policy).penalty_for(Decimal('100.00'), days_late)
+
+    def test_flat(self):
+        self.assertEqual(self.penalty(0, fee_type='flat', amount=Decimal('25.00')), Decimal('0.00'))
+        self.assertEqual(self.penalty(1, fee_type='flat', amount=Decimal('25.00')), Decimal('25.00'))
+        self.assertEqual(self.penalty(30, fee_type='flat', amount=Decimal('25.00')), Decimal('25.00'))
+
+    def test_percentage(self):
+        self.assertEqual(self.penalty(3, fee_type='percentage', rate=Decimal('0.1250')), Decimal('12.50'))
+
+    def test_daily(self):
+        policy = {'fee_type': 'daily', 'rate': Decimal('0.0100'), 'amount': Decimal('1.00')}
+        self.assertEqual(self.penalty(5, **policy), Decimal('10.00'))
+
+    def test_daily_compounding(self):
+        policy = {'fee_type': 'daily', 'rate': Decimal('0.0100'), 'compound': True}
+        self.assertEqual(self.penalty(2, **policy), Decimal('2.01'))
+        self.assertEqual(self.penalty(2, amount=Decimal('1.00'), **policy), Decimal('4.01'))
+
+    def test_cap(self):
+        policy = {'fee_type': 'daily', 'rate': Decimal('0.0100'), 'cap': Decimal('20.00')}
+        self.assertEqual(self.penalty(10, **policy), Decimal('10.00'))
+        self.assertEqual(self.penalty(30, **policy), Decimal('20.00'))
+
+
+class RecurringPeriodTests(TestCase):
+    def template(self, start_date, frequency='monthly'):
+        return RecurringBillTemplate(start_date=start_date, frequency=frequency)
+
+    def test_month_end_start_date(self):
+        template = self.template(date(2026, 1, 31))
+        self.assertIsNone(template.period_containing(date(2026, 1, 30)))
+        self.assertEqual(template.period_containing(date(2026, 1, 31)), date(2026, 1, 31))
+        self.assertEqual(template.period_containing(date(2026, 2, 27)), date(2026, 1, 31))
+        self.assertEqual(template.period_containing(date(2026, 2, 28)), date(2026, 2, 28))
+        self.assertEqual(template.period_containing(date(2026, 3, 30)), date(2026, 2, 28))
+        self.assertEqual(template.period_containing(date(2026, 3, 31)), date(2026, 3, 31))
+        self.assertEqual(template.period_containing(date(2026, 4, 30)), date(2026, 4, 30))
+
+    def test_leap_day_start_date(self):
+        template = self.template(date(2028, 2, 29), 'yearly')
+        self.assertEqual(template.period_containing(date(2029, 2, 28)), date(2029, 2, 28))
+        self.assertEqual(template.period_containing(date(2029, 2, 27)), date(2028, 2, 29))
+
+    def test_quarterly(self):
+        template = self.template(date(2026, 1, 31), 'quarterly')
+        self.assertEqual(template.period_containing(date(2026, 3, 31)), date(2026, 1, 31))
+        self.assertEqual(template.period_containing(date(2026, 4, 29)), date(2026, 1, 31))
+        self.assertEqual(template.period_containing(date(2026, 4, 30)), date(2026, 4, 30))
+        self.assertEqual(template.period_containing(date(2026, 7, 31)), date(2026, 7, 31))
+        self.assertEqual(template.period_containing(date(2026, 12, 31)), date(2026, 10, 31))
+
+    def test_yearly(self):
+        template = self.template(date(2026, 3, 15), 'yearly')
+        self.assertIsNone(template.period_containing(date(2026, 3, 14)))
+        self.assertEqual(template.period_containing(date(2027, 3, 14)), date(2026, 3, 15))
+        self.assertEqual(template.period_containing(date(2027, 3, 15)), date(2027, 3, 15))
+        self.assertEqual(template.period_containing(date(2028, 1, 1)), date(2027, 3, 15))
+
+
+class RecurringGenerateTests(TestCase):
+    def test_generating_a_period_twice_creates_its_bills_once(self):
+        leader = make_leader()
+        make_residents(leader, 3)
+        template = RecurringBillTemplate.objects.create(
+            union_leader=leader, name='Maintenance', bill_type='maintenance', frequency='monthly',
+            amount=Decimal('25.00'), start_date=date(2026, 1, 1),
+        )
+
+        self.assertEqual(RecurringBillTemplate.generate(date(2026, 2, 10)), (1, 3))
+        self.assertEqual(RecurringBillTemplate.generate(date(2026, 2, 20)), (1, 0))
+        self.assertEqual(template.bills.count(), 3)
+        self.assertEqual(set(template.bills.values_list('period', flat=True)), {date(2026, 2, 1)})
+
+        self.assertEqual(RecurringBillTemplate.generate(date(2026, 3, 1)), (1, 3))
+        self.assertEqual(template.bills.count(), 6)
+
+
+class SlabChargeTests(TestCase):
+    SLABS = [{'up_to': 100, 'rate': '1.50'}, {'up_to': 200, 'rate': '2.00'}, {'up_to': None, 'rate': '3.00'}]
+
+    def test_each_slab_boundary(self):
+        consumption = [Decimal(units) for units in ('0', '100', '100.5', '200', '250')]
+        self.assertEqual(
+            slab_charges(consumption, self.SLABS, Decimal('10.00')),
+            [Decimal('10.00'), Decimal('160.00'), Decimal('161.00'), Decimal('360.00'), Decimal('510.00')]
+        )
+
+    def test_fixed_charge_only(self):
+        self.assertEqual(
+            slab_charges([Decimal('0'), Decimal('40')], [{'up_to': None, 'rate': '0'}], Decimal('7.50')),
+            [Decimal('7.50'), Decimal('7.50')]
+        )
+
+
+class BillReadingsTests(TestCase):
+    def setUp(self):
+        self.leader = make_leader()
+        self.resident = make_residents(self.leader, 1)[0]
+        UtilityTariff.objects.create(
+            union_leader=self.leader, utility='water', fixed_charge=Decimal('5.00'),
+            slabs=[{'up_to': None, 'rate': '2.00'}],
+        )
+
+    def import_reading(self, reading, period):
+        rows = parse_readings(f'home_id,reading\n{self.resident.home_id},{reading}\n')
+        return bill_readings(rows, self.leader, 'water', period)
+
+    def test_first_reading_is_a_baseline(self):
+        report = self.import_reading('100', date(2026, 1, 1))
+        self.assertEqual((report['readings_recorded'], report['baseline_readings'], report['bills_created']), (1, 1, 0))
+        self.assertIsNone(MeterReading.objects.get().consumption)
+
+        report = self.import_reading('150', date(2026, 2, 1))
+        self.assertEqual((report['bills_created'], report['total_amount']), (1, Decimal('105.00')))
+        bill = Bill.objects.get()
+        self.assertEqual((bill.resident_id, bill.amount, bill.bill_type), (self.resident.pk, Decimal('105.00'), 'utilities'))
+
+    def test_reading_below_previous_is_left_for_review(self):
+        self.import_reading('100', date(2026, 1, 1))
+        report = self.import_reading('90', date(2026, 2, 1))
+        self.assertEqual(report['readings_recorded'], 0)
+        self.assertEqual([row['reason'] for row in report['review']], ['reading_below_previous'])
+        self.assertEqual(MeterReading.objects.count(), 1)
+        self.assertFalse(Bill.objects.exists())
+
+
+class UtilityTariffApiTests(TestCase):
+    def test_one_tariff_per_utility(self):
+        leader = make_leader()
+        client = APIClient()
+        client.force_authenticate(leader)
+        data = {'utility': 'water', 'fixed_charge': '5.00', 'slabs': [{'up_to': None, 'rate': '2.00'}]}
+        response = client.post('/api/billing/tariffs/', data, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        response = client.post('/api/billing/tariffs/', data, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('utility', response.data)
+
+        tariff = UtilityTariff.objects.get()
+        response = client.patch(f'/api/billing/tariffs/{tariff.pk}/', {'fixed_charge': '6.00'}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+
+class AllocateTests(TestCase):
+    def test_shares_sum_to_the_amount_in_cents(self):
+        for amount, weights in (('100.00', [1, 1, 1]), ('0.05', [1, 1, 1, 1]), ('1234.57', [500, 600, 700, 0.5])):
+            shares = allocate(Decimal(amount), weights)
+            self.assertEqual(sum(shares), Decimal(amount))
+            self.assertTrue(all(share == share.quantize(Decimal('0.01')) for share in shares))
+
+    def test_leftover_cents_go_to_the_largest_remainders_then_earlier_shares(self):
+        self.assertEqual(allocate(Decimal('100.00'), [1, 1, 1]), [Decimal('33.34'), Decimal('33.33'), Decimal('33.33')])
+        self.assertEqual(allocate(Decimal('0.02'), [1, 1, 1]), [Decimal('0.01'), Decimal('0.01'), Decimal('0')])
+        # 10.00 by 1:2 is 3.333.. and 6.666..; the larger remainder wins the cent
+        self.assertEqual(allocate(Decimal('10.00'), [1, 2]), [Decimal('3.33'), Decimal('6.67')])
+
+    def test_zero_weights(self):
+        self.assertEqual(allocate(Decimal('10.00'), [0, 1, 0]), [Decimal('0'), Decimal('10.00'), Decimal('0')])
+        with self.assertRaises(AllocationError):
+            allocate(Decimal('10.00'), [0, 0])
+        with self.assertRaises(AllocationError):
+            allocate(Decimal('10.00'), [])
+
+    def test_negative_weights(self):
+        with self.assertRaises(AllocationError):
+            allocate(Decimal('10.00'), [2, -1])
+
+
+class AllocationErrorHandlingTests(TestCase):
+    def setUp(self):
+        self.leader = make_leader()
+        self.residents = make_residents(self.leader, 2)
+        self.client = APIClient()
+        self.client.force_authenticate(self.leader)
+
+    def test_custom_weights_must_name_active_residents(self):
+        self.residents[0].is_active = False
+        self.residents[0].save()
+        response = self.client.post('/api/billing/shared-bills/', {
+            'amount': '100.00', 'due_date': '2026-02-01', 'bill_type': 'maintenance',
+            'allocation_method': 'custom', 'allocation_weights': {str(self.residents[0].pk): 1},
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('allocation_weights', response.data)
+
+    def test_failed_shared_bill_fan_out_is_rolled_back(self):
+        with mock.patch('billing.models.allocate_to_residents', side_effect=AllocationError('No weights')):
+            response = self.client.post('/api/billing/shared-bills/', {
+                'amount': '100.00', 'due_date': '2026-02-01', 'bill_type': 'maintenance',
+            }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(SharedBill.objects.exists())
+        self.assertFalse(Bill.objects.exists())
+
+    def test_failed_expense_fan_out_leaves_the_expense_pending(self):
+        expense = Expense.objects.create(
+            amount=Decimal('90.00'), date=date(2026, 2, 1), category='maintenance', created_by=self.leader,
+            allocation_method='custom', allocation_weights={str(self.residents[0].pk): 1},
+        )
+        # The only weighted resident moves out before the expense is approved
+        self.residents[0].is_active = False
+        self.residents[0].save()
 
-# Create your tests here.
+        response = self.client.post(f'/api/billing/expenses/{expense.pk}/approve/')
+        self.assertEqual(response.status_code, 400)
+        expense.refresh_from_db()
+        self.assertEqual((expense.status, expense.share_distributed), ('pending', False))
+        self.assertFalse(Bill.objects.exists())
+        self.assertFalse(ExpenseRollup.objects.filter(status='approved', count__gt=0).exists())
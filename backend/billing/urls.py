@@ -1,13 +1,21 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import BillViewSet, PaymentViewSet, SharedBillViewSet, ExpenseViewSet
+from .views import (
+    BillViewSet, PaymentViewSet, SharedBillViewSet, RecurringBillTemplateViewSet, ExpenseViewSet,
+    LateFeePolicyViewSet, UtilityTariffViewSet, MeterReadingViewSet, statement
+)
 
 router = DefaultRouter()
 router.register('shared-bills', SharedBillViewSet)
+router.register('recurring-bills', RecurringBillTemplateViewSet)
+router.register('late-fee-policies', LateFeePolicyViewSet)
+router.register('tariffs', UtilityTariffViewSet)
+router.register('meter-readings', MeterReadingViewSet)
 router.register('bills', BillViewSet)
 router.register('payments', PaymentViewSet)
 router.register('expenses', ExpenseViewSet)
 
 urlpatterns = [
+    path('statement/', statement, name='statement'),
     path('', include(router.urls)),
 ]
@@ -1,22 +1,114 @@
 from rest_framework import viewsets, permissions, status, filters, serializers
-from rest_framework.decorators import action
+from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import PageNumberPagination, CursorPagination
+from rest_framework.renderers import JSONRenderer
 from django.utils import timezone
-from django.db.models import Q, Sum
-from .models import Bill, Payment, SharedBill, Expense
+from django.utils.dateparse import parse_date
+from django.http import StreamingHttpResponse
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.core.exceptions import ValidationError
+from django.core.cache import cache
+from django.db.models import F, Q, Sum, Count, Exists, OuterRef, Prefetch, Value, DecimalField, Case, When
+from django.db.models.functions import Coalesce
+from .models import (
+    Bill, Payment, SharedBill, Expense, ExpenseRollup, ResidentExpenseShare, IdempotencyKey, PenaltyEntry,
+    RecurringBillTemplate, UtilityTariff, MeterReading, LateFeePolicy,
+    BULK_BATCH_SIZE
+)
+from .allocation import AllocationError
 from .serializers import (
     BillSerializer, BillCreateSerializer,
-    PaymentSerializer, PaymentCreateSerializer,
-    SharedBillSerializer, SharedBillCreateSerializer,
-    ExpenseSerializer, ExpenseCreateSerializer
+    PaymentSerializer, PaymentListSerializer, PaymentCreateSerializer,
+    SharedBillSerializer, SharedBillCreateSerializer, RecurringBillTemplateSerializer,
+    UtilityTariffSerializer, MeterReadingSerializer, LateFeePolicySerializer,
+    ExpenseSerializer, ExpenseShareSummarySerializer, ExpenseCreateSerializer,
+    ResidentExpenseShareSerializer
 )
+from datetime import timedelta
 from decimal import Decimal
+import csv
+import json
+
+EXPORT_CHUNK_SIZE = 2000
+AGING_CACHE_TIMEOUT = 60 * 10
+# Lookups a batch request may select bills by instead of listing ids
+BATCH_FILTERS = {
+    'status': 'status',
+    'bill_type': 'bill_type',
+    'resident': 'resident_id',
+    'block': 'resident__home__block',
+    'shared_bill': 'shared_bill_id',
+    'due_before': 'due_date__lt',
+    'due_after': 'due_date__gt',
+}
+
+class Echo:
+    """File-like object whose write() hands the value back, for streaming csv.writer output."""
+    def write(self, value):
+        return value
+
+def stream_export(request, queryset, columns, filename):
+    """Stream queryset as CSV (default) or NDJSON (?output=ndjson) in constant memory.
+
+    columns is a list of (header, lookup) pairs; rows are fetched as flat
+    tuples with values_list() so no model instances or serializers are built.
+    """
+    headers = [header for header, _ in columns]
+    rows = queryset.values_list(*[lookup for _, lookup in columns]).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+    if request.query_params.get('output') == 'ndjson':
+        content = (json.dumps(dict(zip(headers, row)), cls=DjangoJSONEncoder) + '\n' for row in rows)
+        response = StreamingHttpResponse(content, content_type='application/x-ndjson')
+        response['Content-Disposition'] = f'attachment; filename="{filename}.ndjson"'
+        return response
+
+    writer = csv.writer(Echo())
+
+    def csv_lines():
+        yield writer.writerow(headers)
+        for row in rows:
+            yield writer.writerow(row)
+
+    response = StreamingHttpResponse(csv_lines(), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+    return response
+
+class StandardCursorPagination(CursorPagination):
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        # Views with OrderingFilter only override the keyset order when ?ordering= is given
+        if 'ordering' not in request.query_params:
+            return self.ordering
+        return super().get_ordering(request, queryset, view)
 
 class StandardResultsSetPagination(PageNumberPagination):
+    """Page-number pagination with an opt-in keyset mode.
+
+    Pass ?pagination=cursor (or follow a ?cursor= link) to page by the view's
+    cursor_ordering instead; that mode skips the COUNT(*) and the OFFSET scan.
+    """
     page_size = 10
     page_size_query_param = 'page_size'
     max_page_size = 100
+    cursor_paginator = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if request.query_params.get('pagination') == 'cursor' or 'cursor' in request.query_params:
+            self.cursor_paginator = StandardCursorPagination()
+            self.cursor_paginator.ordering = getattr(view, 'cursor_ordering', StandardCursorPagination.ordering)
+            return self.cursor_paginator.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
 
 class SharedBillViewSet(viewsets.ModelViewSet):
     queryset = SharedBill.objects.all()
@@ -30,55 +122,150 @@ class SharedBillViewSet(viewsets.ModelViewSet):
             return SharedBillCreateSerializer
         return SharedBillSerializer
 
+    def perform_create(self, serializer):
+        # distribute() fans out to this union leader's residents
+        try:
+            serializer.save(union_leader=self.request.user)
+        except AllocationError as exc:
+            raise serializers.ValidationError({'allocation_weights': str(exc)})
+
     @action(detail=False, methods=['post'])
     def generate_monthly_bills(self, request):
         from residents.models import Resident
-        from homes.models import Home
-        from datetime import datetime, timedelta
+        from datetime import timedelta
         # Calculate next month's due date (1st of next month)
         today = timezone.now()
         next_month = today.replace(day=1) + timedelta(days=32)
         due_date = next_month.replace(day=1).date()
         force = request.data.get('force', False)
-        bills_created = []
-        # Get all active residents for this union leader
-        residents = Resident.objects.filter(is_active=True, union_leader=request.user, home__isnull=False)
-        for resident in residents:
-            home = resident.home
-            if home and home.rent > 0:
-                # Optionally delete existing rent bill for this resident and due_date if force is set
-                if force:
-                    Bill.objects.filter(
-                        resident=resident,
-                        bill_type='rent',
-                        due_date=due_date
-                    ).delete()
-                # Check if a rent bill already exists for this resident and due_date
-                if not Bill.objects.filter(resident=resident, bill_type='rent', due_date=due_date).exists():
-                    bill = Bill.objects.create(
-                        resident=resident,
-                        amount=home.rent,
-                        due_date=due_date,
-                        bill_type='rent',
-                        description=f'Monthly rent for {home} - {due_date.strftime("%B %Y")}',
-                        union_leader=request.user
-                    )
-                    bills_created.append(bill)
-        if not bills_created:
+        # Get all active residents for this union leader, with their homes, in one query
+        residents = Resident.objects.filter(
+            is_active=True, union_leader=request.user, home__isnull=False, home__rent__gt=0
+        ).select_related('home')
+        existing_rent = Bill.objects.filter(resident=OuterRef('pk'), bill_type='rent', due_date=due_date)
+        with transaction.atomic():
+            # Optionally delete existing rent bills for these residents and due_date if force is set
+            if force:
+                Bill.objects.filter(resident__in=residents, bill_type='rent', due_date=due_date).delete()
+            # Only residents without a rent bill for due_date
+            missing = residents.filter(~Exists(existing_rent)).order_by('pk')
+            bills = Bill.objects.bulk_create([
+                Bill(
+                    resident=resident,
+                    amount=resident.home.rent,
+                    due_date=due_date,
+                    bill_type='rent',
+                    description=f'Monthly rent for {resident.home} - {due_date.strftime("%B %Y")}',
+                    union_leader=request.user
+                )
+                for resident in missing
+            ], batch_size=BULK_BATCH_SIZE)
+        if not bills:
             return Response({
                 'detail': 'No new bills were generated. Bills may already exist for next month.'
             }, status=status.HTTP_200_OK)
         return Response({
-            'detail': f'{len(bills_created)} monthly rent bills were generated successfully.',
-            'bills': BillSerializer(bills_created, many=True).data
+            'detail': f'{len(bills)} monthly rent bills were generated successfully.',
+            'due_date': due_date,
+            'bills_created': len(bills),
+            'total_amount': sum(bill.amount for bill in bills)
         }, status=status.HTTP_201_CREATED)
 
+class RecurringBillTemplateViewSet(viewsets.ModelViewSet):
+    queryset = RecurringBillTemplate.objects.all()
+    serializer_class = RecurringBillTemplateSerializer
+    permission_classes = [permissions.IsAuthenticated, permissions.IsAdminUser]
+    filter_backends = [filters.SearchFilter]
+    search_fields = ['name', 'bill_type', 'description']
+    pagination_class = StandardResultsSetPagination
+
+    def get_queryset(self):
+        return super().get_queryset().filter(union_leader=self.request.user).prefetch_related('residents').order_by('name')
+
+    def perform_create(self, serializer):
+        serializer.save(union_leader=self.request.user)
+
+    @action(detail=False, methods=['post'])
+    def generate(self, request):
+        """Materialize this union leader's recurring bills for the period containing as_of (default today)."""
+        as_of = request.data.get('as_of')
+        if as_of:
+            as_of = parse_date(str(as_of))
+            if as_of is None:
+                return Response({'error': 'as_of must be a date (YYYY-MM-DD)'}, status=status.HTTP_400_BAD_REQUEST)
+        templates_due, bills_created = RecurringBillTemplate.generate(as_of=as_of, union_leader=request.user)
+        return Response({
+            'templates_due': templates_due,
+            'bills_created': bills_created
+        }, status=status.HTTP_201_CREATED if bills_created else status.HTTP_200_OK)
+
+class LateFeePolicyViewSet(viewsets.ModelViewSet):
+    """A union leader's late fee policies; without any, PenaltyRun applies LateFeePolicy.default()."""
+    queryset = LateFeePolicy.objects.all()
+    serializer_class = LateFeePolicySerializer
+    permission_classes = [permissions.IsAuthenticated, permissions.IsAdminUser]
+
+    def get_queryset(self):
+        return super().get_queryset().filter(union_leader=self.request.user).order_by('bill_type')
+
+    def perform_create(self, serializer):
+        serializer.save(union_leader=self.request.user)
+
+class UtilityTariffViewSet(viewsets.ModelViewSet):
+    queryset = UtilityTariff.objects.all()
+    serializer_class = UtilityTariffSerializer
+    permission_classes = [permissions.IsAuthenticated, permissions.IsAdminUser]
+
+    def get_queryset(self):
+        return super().get_queryset().filter(union_leader=self.request.user).order_by('utility')
+
+    def perform_create(self, serializer):
+        serializer.save(union_leader=self.request.user)
+
+class MeterReadingViewSet(viewsets.ReadOnlyModelViewSet):
+    queryset = MeterReading.objects.all()
+    serializer_class = MeterReadingSerializer
+    permission_classes = [permissions.IsAuthenticated, permissions.IsAdminUser]
+    pagination_class = StandardResultsSetPagination
+    cursor_ordering = ('-period', '-id')
+
+    def get_queryset(self):
+        queryset = super().get_queryset().filter(union_leader=self.request.user).select_related('home')
+        utility = self.request.query_params.get('utility')
+        period = self.request.query_params.get('period')
+        if utility:
+            queryset = queryset.filter(utility=utility)
+        if period:
+            queryset = queryset.filter(period=period)
+        return queryset
+
+    @action(detail=False, methods=['post'])
+    def import_readings(self, request):
+        """Record an uploaded CSV of meter readings for one utility and period and bill the consumption."""
+        from .meters import parse_readings, parse_period, bill_readings, MeterReadingError
+        readings = request.FILES.get('file')
+        utility = request.data.get('utility')
+        period = parse_period(request.data.get('period'))
+        if not readings:
+            return Response({'error': 'file is required'}, status=status.HTTP_400_BAD_REQUEST)
+        if utility not in dict(MeterReading._meta.get_field('utility').choices):
+            return Response({'error': 'utility must be water, electricity or gas'}, status=status.HTTP_400_BAD_REQUEST)
+        if period is None:
+            return Response({'error': 'period must be a month (YYYY-MM)'}, status=status.HTTP_400_BAD_REQUEST)
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true', 'yes')
+        try:
+            report = bill_readings(parse_readings(readings.read()), request.user, utility, period, dry_run=dry_run)
+        except MeterReadingError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report)
+
 class BillViewSet(viewsets.ModelViewSet):
     queryset = Bill.objects.all()
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [filters.SearchFilter]
     search_fields = ['bill_type', 'status', 'description']
     pagination_class = StandardResultsSetPagination
+    cursor_ordering = ('-created_at', '-id')
     
     def get_serializer_class(self):
         if self.action == 'create':
@@ -86,15 +273,10 @@ class BillViewSet(viewsets.ModelViewSet):
         return BillSerializer
     
     def get_queryset(self):
-        queryset = super().get_queryset().order_by('-created_at')  # Add default ordering
-        # Apply penalty to overdue, unpaid bills
-        from datetime import date
-        overdue_bills = queryset.filter(status='pending', due_date__lt=date.today(), penalty_amount=0)
-        for bill in overdue_bills:
-            penalty = bill.amount * Decimal('0.10')
-            bill.penalty_amount = penalty
-            bill.amount += penalty
-            bill.save(update_fields=['penalty_amount', 'amount'])
+        queryset = super().get_queryset().select_related(
+            'resident__user', 'resident__home', 'resident__union_leader', 'shared_bill'
+        ).order_by('-created_at')  # Add default ordering
+        # Penalties are applied by the apply_penalties command, not on read
         
         # Filter by date range
         start_date = self.request.query_params.get('start_date')
@@ -132,23 +314,233 @@ class BillViewSet(viewsets.ModelViewSet):
             )
         
         bill.status = 'paid'
-        bill.save()
+        bill.save(update_fields=['status', 'updated_at'])
         return Response(BillSerializer(bill).data)
 
+    def _batch(self, request, skip_reason, apply):
+        """Run one set-based bill update over bills selected by id or by filter.
+
+        The request body carries either "ids" (a list of bill ids) or "filter"
+        (an object using the BATCH_FILTERS keys). Matching bills are locked,
+        skip_reason(bill_values) names the ones to leave alone, and
+        apply(queryset) updates the rest in a single statement. The response
+        maps every requested id to its outcome.
+        """
+        ids, selection = request.data.get('ids'), request.data.get('filter')
+        queryset = Bill.objects.filter(union_leader=request.user)
+        if ids is not None:
+            try:
+                # JSON true/false would otherwise pass as bill ids 1 and 0
+                ids = {int(bill_id) for bill_id in ids} if isinstance(ids, list) and not any(
+                    isinstance(bill_id, bool) for bill_id in ids
+                ) else None
+            except (TypeError, ValueError):
+                ids = None
+            if not ids:
+                return Response({'error': 'ids must be a non-empty list of bill ids'}, status=status.HTTP_400_BAD_REQUEST)
+            queryset = queryset.filter(pk__in=ids)
+        elif isinstance(selection, dict) and selection:
+            unknown = set(selection) - set(BATCH_FILTERS)
+            if unknown:
+                return Response(
+                    {'error': f'Unsupported filter keys: {", ".join(sorted(unknown))}'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            invalid = sorted(
+                key for key, value in selection.items() if isinstance(value, bool) or not isinstance(value, (str, int))
+            )
+            if invalid:
+                return Response(
+                    {'error': f'Filter values must be strings or numbers: {", ".join(invalid)}'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            try:
+                queryset = queryset.filter(**{BATCH_FILTERS[key]: value for key, value in selection.items()})
+            except (TypeError, ValueError, ValidationError) as exc:
+                return Response({'error': f'Invalid filter: {exc}'}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            return Response({'error': 'Provide ids or a non-empty filter'}, status=status.HTTP_400_BAD_REQUEST)
+
+        results = {}
+        with transaction.atomic():
+            # Lock in primary-key order so overlapping batches cannot deadlock
+            bills = list(
+                Bill.objects.select_for_update().filter(pk__in=queryset.values('pk')).order_by('pk')
+                .values('id', 'status', 'amount', 'penalty_amount', 'penalty_waived', 'amount_paid', 'amount_approved')
+            )
+            selected = []
+            for bill in bills:
+                reason = skip_reason(bill)
+                if reason:
+                    results[bill['id']] = reason
+                else:
+                    selected.append(bill['id'])
+            if selected:
+                apply(Bill.objects.filter(pk__in=selected))
+
+        results.update({bill_id: 'updated' for bill_id in selected})
+        if ids is not None:
+            results.update({bill_id: 'not_found' for bill_id in ids - set(results)})
+        return Response({
+            'matched': len(bills),
+            'updated': len(selected),
+            'results': results
+        })
+
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated, permissions.IsAdminUser])
+    def batch_mark_paid(self, request):
+        return self._batch(
+            request,
+            lambda bill: 'already_paid' if bill['status'] == 'paid' else None,
+            lambda bills: bills.update(status='paid', updated_at=timezone.now())
+        )
+
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated, permissions.IsAdminUser])
+    def batch_waive_penalty(self, request):
+        """Write off the late fees on the selected bills and stop further accrual."""
+        def skip_reason(bill):
+            if bill['status'] == 'paid':
+                return 'already_paid'
+            if bill['penalty_waived'] and not bill['penalty_amount']:
+                return 'already_waived'
+
+        def waive(bills):
+            today = timezone.now().date()
+            PenaltyEntry.objects.bulk_create([
+                PenaltyEntry(bill_id=bill_id, entry_type='waiver', amount=-penalty, entry_date=today)
+                for bill_id, penalty in bills.filter(penalty_amount__gt=0).values_list('id', 'penalty_amount')
+            ], batch_size=BULK_BATCH_SIZE)
+            bills.update(
+                penalty_amount=0,
+                penalty_waived=True,
+                status=Case(When(amount_approved__gte=F('amount'), then=Value('paid')), default=F('status')),
+                updated_at=timezone.now()
+            )
+
+        return self._batch(request, skip_reason, waive)
+
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated, permissions.IsAdminUser])
+    def batch_change_due_date(self, request):
+        due_date = parse_date(str(request.data.get('due_date') or ''))
+        if due_date is None:
+            return Response({'error': 'due_date must be a date (YYYY-MM-DD)'}, status=status.HTTP_400_BAD_REQUEST)
+        return self._batch(
+            request,
+            lambda bill: 'already_paid' if bill['status'] == 'paid' else None,
+            lambda bills: bills.update(due_date=due_date, updated_at=timezone.now())
+        )
+
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated, permissions.IsAdminUser])
+    def batch_delete(self, request):
+        # Bills with payments against them, pending or approved, are kept for the payment history
+        def skip_reason(bill):
+            if bill['amount_approved']:
+                return 'has_approved_payments'
+            if bill['amount_paid']:
+                return 'has_pending_payments'
+            return None
+
+        return self._batch(request, skip_reason, lambda bills: bills.delete())
+
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated, permissions.IsAdminUser])
+    def aging(self, request):
+        """Outstanding receivables by days past due, per block and bill type, in one query.
+
+        Cached per union leader and day; pass ?refresh=1 to recompute.
+        """
+        today = timezone.now().date()
+        cache_key = f'billing:aging:{request.user.pk}:{today.isoformat()}'
+        if not request.query_params.get('refresh'):
+            cached = cache.get(cache_key)
+            if cached is not None:
+                return Response(cached)
+
+        money = DecimalField(max_digits=14, decimal_places=2)
+        outstanding = F('amount') + F('penalty_amount') - F('amount_approved')
+        buckets = {
+            'current': Q(due_date__gt=today),
+            '0_30': Q(due_date__lte=today, due_date__gte=today - timedelta(days=30)),
+            '31_60': Q(due_date__lt=today - timedelta(days=30), due_date__gte=today - timedelta(days=60)),
+            '61_90': Q(due_date__lt=today - timedelta(days=60), due_date__gte=today - timedelta(days=90)),
+            '90_plus': Q(due_date__lt=today - timedelta(days=90)),
+        }
+        rows = list(
+            Bill.objects.filter(union_leader=request.user).exclude(status='paid')
+            .values(block=F('resident__home__block'), type=F('bill_type'))
+            .annotate(**{
+                name: Coalesce(Sum(outstanding, filter=condition), Value(Decimal('0')), output_field=money)
+                for name, condition in buckets.items()
+            }, bills=Count('id'))
+            .order_by('block', 'type')
+        )
+
+        def add(totals, row):
+            for name in list(buckets) + ['bills']:
+                totals[name] = totals.get(name, 0) + row[name]
+
+        by_block, by_type, overall = {}, {}, {}
+        for row in rows:
+            add(by_block.setdefault(row['block'] or 'unassigned', {}), row)
+            add(by_type.setdefault(row['type'], {}), row)
+            add(overall, row)
+
+        report = {
+            'as_of': today,
+            'buckets': list(buckets),
+            'rows': rows,
+            'by_block': by_block,
+            'by_bill_type': by_type,
+            'total': overall,
+        }
+        report = json.loads(JSONRenderer().render(report))
+        cache.set(cache_key, report, AGING_CACHE_TIMEOUT)
+        return Response(report)
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Stream all bills matching the list filters as CSV or NDJSON."""
+        queryset = self.filter_queryset(self.get_queryset()).select_related(None)
+        return stream_export(request, queryset, [
+            ('id', 'id'),
+            ('resident_id', 'resident_id'),
+            ('resident_username', 'resident__user__username'),
+            ('resident_first_name', 'resident__user__first_name'),
+            ('resident_last_name', 'resident__user__last_name'),
+            ('unit_number', 'resident__unit_number'),
+            ('home_block', 'resident__home__block'),
+            ('home_number', 'resident__home__number'),
+            ('bill_type', 'bill_type'),
+            ('status', 'status'),
+            ('amount', 'amount'),
+            ('penalty_amount', 'penalty_amount'),
+            ('amount_paid', 'amount_paid'),
+            ('amount_approved', 'amount_approved'),
+            ('due_date', 'due_date'),
+            ('payment_date', 'payment_date'),
+            ('shared_bill_id', 'shared_bill_id'),
+            ('description', 'description'),
+            ('created_at', 'created_at'),
+        ], 'bills')
+
 class PaymentViewSet(viewsets.ModelViewSet):
     queryset = Payment.objects.all()
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [filters.SearchFilter]
     search_fields = ['payment_method', 'transaction_id', 'notes']
     pagination_class = StandardResultsSetPagination
+    cursor_ordering = ('-created_at', '-id')
     
     def get_serializer_class(self):
         if self.action == 'create':
             return PaymentCreateSerializer
+        if self.action in ('list', 'by_bill') and self.request.query_params.get('expand') != 'bill':
+            return PaymentListSerializer
         return PaymentSerializer
     
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = super().get_queryset().select_related(
+            'bill__resident__user', 'bill__resident__home', 'bill__resident__union_leader', 'bill__shared_bill'
+        ).order_by('-created_at', '-id')
         
         # Filter by date range
         start_date = self.request.query_params.get('start_date')
@@ -175,6 +567,41 @@ class PaymentViewSet(viewsets.ModelViewSet):
         return queryset
 
     def create(self, request, *args, **kwargs):
+        # Retries carrying the same Idempotency-Key replay the first successful response
+        key = request.headers.get('Idempotency-Key')
+        if not key:
+            return self._create_payment(request)
+
+        request_hash = IdempotencyKey.fingerprint(request.data)
+        record, created = IdempotencyKey.reserve(request.user, 'payments.create', key, request_hash)
+        if not created:
+            if record.request_hash and record.request_hash != request_hash:
+                return Response(
+                    {'error': 'This Idempotency-Key was already used with a different request body'},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                )
+            if record.response_status is None:
+                return Response(
+                    {'error': 'A request with this Idempotency-Key is still being processed'},
+                    status=status.HTTP_409_CONFLICT
+                )
+            response = Response(record.response_body, status=record.response_status)
+            response['Idempotent-Replayed'] = 'true'
+            return response
+
+        # The payment and its stored response commit together, so a crash cannot
+        # leave a payment behind a key that still looks in flight
+        with transaction.atomic():
+            response = self._create_payment(request)
+            if status.is_success(response.status_code):
+                # Store the body as rendered so replays match the original byte for byte
+                record.complete(response.status_code, json.loads(JSONRenderer().render(response.data)))
+        if not status.is_success(response.status_code):
+            # Failed attempts are not cached so the client can correct and retry
+            record.delete()
+        return response
+
+    def _create_payment(self, request):
         try:
             print('Payment Data:', request.data)
             print('Payment Files:', request.FILES)
@@ -197,22 +624,86 @@ class PaymentViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'])
     def approve_payment(self, request, pk=None):
         payment = self.get_object()
-        payment.status = 'approved'
-        payment.save()
-        
-        # Update bill status
-        bill = payment.bill
-        approved_payments = bill.payments.filter(status='approved')
-        total_approved = approved_payments.aggregate(total=Sum('amount'))['total'] or 0
-        
-        if total_approved >= bill.amount:
-            bill.status = 'paid'
-        elif total_approved > 0:
-            bill.status = 'partially_paid'
-        bill.save()
+        with transaction.atomic():
+            # Lock the bill first so concurrent approvals on it are serialized
+            bill = Bill.objects.select_for_update().get(pk=payment.bill_id)
+            payment = Payment.objects.select_for_update().get(pk=payment.pk)
+            payment.status = 'approved'
+            payment.save()
+            
+            # Update bill status
+            bill.refresh_from_db(fields=['amount_paid', 'amount_approved'])
+            bill.settle_status()
+            bill.save(update_fields=['status', 'updated_at'])
         
         return Response(PaymentSerializer(payment).data)
+
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated, permissions.IsAdminUser])
+    def bulk_approve(self, request):
+        """Approve many payments at once, locking each affected bill once."""
+        ids = request.data.get('ids')
+        # JSON true/false would otherwise pass as payment ids 1 and 0
+        if not isinstance(ids, list) or not ids or any(isinstance(payment_id, bool) for payment_id in ids):
+            return Response(
+                {'error': 'ids must be a non-empty list of payment ids'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            ids = {int(payment_id) for payment_id in ids}
+        except (TypeError, ValueError):
+            return Response(
+                {'error': 'ids must be a non-empty list of payment ids'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        skipped = {}
+        with transaction.atomic():
+            bill_ids = self.get_queryset().filter(pk__in=ids).values_list('bill_id', flat=True)
+            # Lock bills in primary-key order to avoid deadlocks between batches
+            bills = {bill.pk: bill for bill in Bill.objects.select_for_update().filter(pk__in=bill_ids).order_by('pk')}
+            payments = list(Payment.objects.select_for_update().filter(pk__in=ids, bill_id__in=bills))
+            to_approve = []
+            for payment in payments:
+                if payment.status == 'approved':
+                    skipped[payment.pk] = 'already_approved'
+                    continue
+                bill = bills[payment.bill_id]
+                if payment.status == 'rejected':
+                    bill.amount_paid += payment.amount
+                bill.amount_approved += payment.amount
+                to_approve.append(payment.pk)
+
+            now = timezone.now()
+            Payment.objects.filter(pk__in=to_approve).update(status='approved', updated_at=now)
+            for bill in bills.values():
+                bill.settle_status()
+                bill.updated_at = now
+            Bill.objects.bulk_update(bills.values(), ['amount_paid', 'amount_approved', 'status', 'updated_at'])
+
+        found = {payment.pk for payment in payments}
+        skipped.update({payment_id: 'not_found' for payment_id in ids - found})
+        return Response({
+            'approved': sorted(to_approve),
+            'skipped': skipped
+        })
     
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated, permissions.IsAdminUser])
+    def import_statement(self, request):
+        """Reconcile an uploaded bank statement (CSV or OFX) against the union leader's open bills."""
+        from .reconciliation import parse_statement, reconcile_statement, StatementError
+        statement = request.FILES.get('file')
+        if not statement:
+            return Response(
+                {'error': 'file is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            lines = parse_statement(statement.read(), statement.name)
+        except StatementError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true', 'yes')
+        return Response(reconcile_statement(lines, request.user, dry_run=dry_run))
+
     @action(detail=True, methods=['post'])
     def reject_payment(self, request, pk=None):
         payment = self.get_object()
@@ -233,6 +724,33 @@ class PaymentViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(payments, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Stream all payments matching the list filters as CSV or NDJSON."""
+        queryset = self.filter_queryset(self.get_queryset()).order_by('-created_at', '-id')
+        return stream_export(request, queryset, [
+            ('id', 'id'),
+            ('bill_id', 'bill_id'),
+            ('bill_type', 'bill__bill_type'),
+            ('resident_id', 'bill__resident_id'),
+            ('resident_username', 'bill__resident__user__username'),
+            ('unit_number', 'bill__resident__unit_number'),
+            ('amount', 'amount'),
+            ('payment_date', 'payment_date'),
+            ('payment_method', 'payment_method'),
+            ('transaction_id', 'transaction_id'),
+            ('status', 'status'),
+            ('notes', 'notes'),
+            ('created_at', 'created_at'),
+        ], 'payments')
+
+def resident_shares_prefetch():
+    """Prefetch for Expense.resident_shares carrying what ResidentExpenseShareSerializer reads."""
+    return Prefetch(
+        'resident_shares',
+        queryset=ResidentExpenseShare.objects.select_related('resident__user').order_by('pk')
+    )
+
 class ExpenseViewSet(viewsets.ModelViewSet):
     queryset = Expense.objects.all()
     permission_classes = [permissions.IsAuthenticated]
@@ -241,27 +759,17 @@ class ExpenseViewSet(viewsets.ModelViewSet):
     ordering_fields = ['date', 'amount', 'category', 'status']
     ordering = ['-date']
     pagination_class = StandardResultsSetPagination
+    cursor_ordering = ('-date', '-id')
 
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = super().get_queryset().select_related('created_by', 'approved_by', 'resident__user')
         user = self.request.user
 
         # If user is not admin, only show:
         # 1. Their personal expenses
         # 2. Their share of shared expenses
         if not user.is_staff:
-            from residents.models import Resident
-            try:
-                resident = Resident.objects.get(user=user)
-                # Get personal expenses
-                personal_expenses = queryset.filter(resident=resident, is_shared=False)
-                # Get shared expenses through ResidentExpenseShare
-                shared_expense_ids = resident.expense_shares.values_list('expense_id', flat=True)
-                shared_expenses = queryset.filter(id__in=shared_expense_ids)
-                # Combine both querysets
-                queryset = personal_expenses | shared_expenses
-            except Resident.DoesNotExist:
-                return queryset.none()
+            queryset = queryset.visible_to_resident(user)
         else:
             queryset = queryset.filter(union_leader=user)
 
@@ -279,8 +787,17 @@ class ExpenseViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(category=category)
         if status:
             queryset = queryset.filter(status=status)
-        
-        return queryset
+
+        # ?shares=summary returns share counts and totals instead of every share row
+        if self.request.query_params.get('shares') == 'summary':
+            return queryset.annotate(
+                share_count=Count('resident_shares'),
+                share_total=Coalesce(
+                    Sum('resident_shares__share_amount'), Value(Decimal('0')),
+                    output_field=DecimalField(max_digits=12, decimal_places=2)
+                )
+            )
+        return queryset.prefetch_related(resident_shares_prefetch())
 
     @action(detail=False)
     def my_shares(self, request):
@@ -288,18 +805,21 @@ class ExpenseViewSet(viewsets.ModelViewSet):
         user = request.user
         if not user.is_staff:
             from residents.models import Resident
-            try:
-                resident = Resident.objects.get(user=user)
-                shares = resident.expense_shares.select_related('expense').all()
-                serializer = ResidentExpenseShareSerializer(shares, many=True)
-                return Response(serializer.data)
-            except Resident.DoesNotExist:
+            shares = list(
+                ResidentExpenseShare.objects.filter(resident__user=user)
+                .select_related('expense', 'resident__user').order_by('pk')
+            )
+            if not shares and not Resident.objects.filter(user=user).exists():
                 return Response({'error': 'User is not associated with any resident'}, status=400)
+            serializer = ResidentExpenseShareSerializer(shares, many=True)
+            return Response(serializer.data)
         return Response({'error': 'This endpoint is only for residents'}, status=400)
     
     def get_serializer_class(self):
         if self.action == 'create':
             return ExpenseCreateSerializer
+        if self.request.query_params.get('shares') == 'summary':
+            return ExpenseShareSummarySerializer
         return ExpenseSerializer
     
     def perform_create(self, serializer):
@@ -310,8 +830,14 @@ class ExpenseViewSet(viewsets.ModelViewSet):
         expense = self.get_object()
         expense.status = 'approved'
         expense.approved_by = request.user
-        expense.save()
-        expense.distribute_shares()  # Explicitly create bills for shared expense
+        try:
+            # Approval and the fan-out succeed or fail together
+            with transaction.atomic():
+                expense.save()
+                expense.distribute_shares()  # Explicitly create bills for shared expense
+        except AllocationError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        expense = self.get_object()  # Reload so the new shares come back prefetched
         return Response(ExpenseSerializer(expense).data)
     
     @action(detail=True, methods=['post'])
@@ -323,42 +849,135 @@ class ExpenseViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def summary(self, request):
-        from django.db.models import Sum
         from django.db.models.functions import ExtractMonth, ExtractYear
         
         # Get query parameters
         year = request.query_params.get('year', timezone.now().year)
         month = request.query_params.get('month')
+        category = request.query_params.get('category')
         
-        # Base queryset - use get_queryset() to respect permissions
-        queryset = self.get_queryset().filter(status='approved')
-        
-        # Apply year filter
-        queryset = queryset.filter(date__year=year)
-        
-        # Apply month filter if provided
-        if month:
-            queryset = queryset.filter(date__month=month)
-        
-        # Get total by category
-        category_totals = queryset.values('category').annotate(
-            total=Sum('amount')
-        ).order_by('-total')
-        
-        # Get monthly totals
-        monthly_totals = queryset.annotate(
-            month=ExtractMonth('date'),
-            year=ExtractYear('date')
-        ).values('month', 'year').annotate(
-            total=Sum('amount')
-        ).order_by('year', 'month')
-        
-        # Calculate total amount
-        total_amount = queryset.aggregate(total=Sum('amount'))['total'] or 0
+        # Union leaders read the pre-aggregated monthly rollups unless a filter
+        # the rollups cannot answer (date range, status) is given
+        raw_filters = ('start_date', 'end_date', 'status')
+        if request.user.is_staff and not any(request.query_params.get(name) for name in raw_filters):
+            queryset = ExpenseRollup.objects.filter(union_leader=request.user, status='approved', year=year, count__gt=0)
+            if month:
+                queryset = queryset.filter(month=month)
+            if category:
+                queryset = queryset.filter(category=category)
+            category_totals = queryset.values('category').annotate(total=Sum('total')).order_by('-total')
+            monthly_totals = queryset.values('month', 'year').annotate(total=Sum('total')).order_by('year', 'month')
+            total_amount = queryset.aggregate(total=Sum('total'))['total'] or 0
+        else:
+            # Base queryset - use get_queryset() to respect permissions
+            queryset = self.get_queryset().filter(status='approved', date__year=year)
+            
+            # Apply month filter if provided
+            if month:
+                queryset = queryset.filter(date__month=month)
+            
+            # Get total by category
+            category_totals = queryset.values('category').annotate(
+                total=Sum('amount')
+            ).order_by('-total')
+            
+            # Get monthly totals
+            monthly_totals = queryset.annotate(
+                month=ExtractMonth('date'),
+                year=ExtractYear('date')
+            ).values('month', 'year').annotate(
+                total=Sum('amount')
+            ).order_by('year', 'month')
+            
+            # Calculate total amount
+            total_amount = queryset.aggregate(total=Sum('amount'))['total'] or 0
         
         return Response({
             'category_totals': category_totals,
             'monthly_totals': monthly_totals,
             'total_amount': total_amount,
-            'total': queryset.aggregate(total=Sum('amount'))['total'] or 0
+            'total': total_amount
+        })
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def statement(request):
+    """Chronological ledger of a resident's bills, late fees and approved payments with a running balance.
+
+    Residents get their own statement; union leaders pass ?resident=<id>.
+    Supports ?start_date/?end_date, ?as_of=<date> for just the balance on a
+    date, and ?output=csv|ndjson to stream the entries.
+    """
+    from residents.models import Resident
+    from .statements import statement_rows, balance_as_of, COLUMNS
+
+    if request.user.is_staff:
+        try:
+            resident_id = int(request.query_params.get('resident', ''))
+        except ValueError:
+            return Response({'error': 'resident must be a resident id'}, status=status.HTTP_400_BAD_REQUEST)
+        resident = Resident.objects.filter(pk=resident_id, union_leader=request.user).first()
+    else:
+        resident = Resident.objects.filter(user=request.user).first()
+    if resident is None:
+        return Response({'error': 'Resident not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    dates = {}
+    for name in ('start_date', 'end_date', 'as_of'):
+        value = request.query_params.get(name)
+        if value:
+            try:
+                dates[name] = parse_date(value)
+            except ValueError:
+                dates[name] = None
+            if dates[name] is None:
+                return Response({'error': f'{name} must be a date (YYYY-MM-DD)'}, status=status.HTTP_400_BAD_REQUEST)
+
+    if 'as_of' in dates:
+        return Response({
+            'resident': resident.pk,
+            'as_of': dates['as_of'],
+            'balance': balance_as_of(resident.pk, dates['as_of'])
         })
+
+    rows = statement_rows(resident.pk, dates.get('start_date'), dates.get('end_date'))
+    output = request.query_params.get('output')
+    if output in ('csv', 'ndjson'):
+        filename = f'statement_{resident.pk}.{output}'
+        if output == 'ndjson':
+            content = (json.dumps(row, cls=DjangoJSONEncoder) + '\n' for row in rows)
+            response = StreamingHttpResponse(content, content_type='application/x-ndjson')
+        else:
+            writer = csv.writer(Echo())
+
+            def csv_lines():
+                yield writer.writerow(COLUMNS)
+                for row in rows:
+                    yield writer.writerow([row[column] for column in COLUMNS])
+
+            response = StreamingHttpResponse(csv_lines(), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    entries = list(rows)
+    if entries:
+        first = entries[0]
+        opening_balance = first['balance'] - first['debit'] + first['credit']
+        closing_balance = entries[-1]['balance']
+    else:
+        # No activity in the range: the balance is whatever it was going in
+        opening_balance = closing_balance = (
+            balance_as_of(resident.pk, dates['start_date'], inclusive=False) if 'start_date' in dates
+            else balance_as_of(resident.pk, dates['end_date']) if 'end_date' in dates
+            else Decimal('0.00')
+        )
+    return Response({
+        'resident': resident.pk,
+        'start_date': dates.get('start_date'),
+        'end_date': dates.get('end_date'),
+        'opening_balance': opening_balance,
+        'closing_balance': closing_balance,
+        'total_debits': sum((entry['debit'] for entry in entries), Decimal('0.00')),
+        'total_credits': sum((entry['credit'] for entry in entries), Decimal('0.00')),
+        'entries': entries
+    })
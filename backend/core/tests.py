@@ -1,3 +1,29 @@
+from datetime import date
+from decimal import Decimal
+
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from billing.models import Bill
+from billing.tests import make_leader, make_residents
+
+
+class ResidentDashboardTests(TestCase):
+    def test_billing_totals_include_late_fees(self):
+        leader = make_leader()
+        resident = make_residents(leader, 1)[0]
+        for status in ('paid', 'pending'):
+            Bill.objects.create(
+                resident=resident, amount=Decimal('100.00'), penalty_amount=Decimal('5.00'),
+                due_date=date(2026, 1, 1), bill_type='rent', status=status, union_leader=leader,
+            )
+        client = APIClient()
+        client.force_authenticate(resident.user)
 
-# Create your tests here.
+        response = client.get('/api/dashboard/resident/')
+        self.assertEqual(response.status_code, 200)
+        billing = response.data['billing']
+        self.assertEqual(
+            (billing['total_amount'], billing['total_paid'], billing['total_pending']),
+            (Decimal('210.00'), Decimal('105.00'), Decimal('105.00'))
+        )
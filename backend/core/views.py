@@ -1,7 +1,7 @@
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Sum, Count
+from django.db.models import F, Q, Sum, Count
 from django.utils import timezone
 from datetime import timedelta
 from billing.models import Bill, Payment
@@ -20,43 +20,45 @@ def admin_dashboard(request):
     today = timezone.now()
     thirty_days_ago = today - timedelta(days=30)
 
-    # Get residents for this union leader
-    residents = Resident.objects.filter(union_leader=request.user) if is_union_leader else Resident.objects.all()
+    # Union leaders only see their own residents' bills and complaints; joined, not a resident__in subquery
+    scope = Q(resident__union_leader=request.user) if is_union_leader else Q()
+    last_30_days = Q(created_at__gte=thirty_days_ago)
 
-    # Get billing stats
-    if is_union_leader:
-        total_bills = Bill.objects.filter(resident__in=residents, created_at__gte=thirty_days_ago)
-    else:
-        total_bills = Bill.objects.filter(created_at__gte=thirty_days_ago)
-    total_amount = total_bills.aggregate(total=Sum('amount'))['total'] or 0
-    total_paid = total_bills.filter(status='paid').aggregate(total=Sum('amount'))['total'] or 0
+    # Billing stats in one query; late fees are part of what is owed
+    billing = Bill.objects.filter(scope, last_30_days).aggregate(
+        total_amount=Sum(F('amount') + F('penalty_amount')),
+        total_paid=Sum(F('amount') + F('penalty_amount'), filter=Q(status='paid'))
+    )
+    total_amount = billing['total_amount'] or 0
+    total_paid = billing['total_paid'] or 0
     total_pending = total_amount - total_paid
 
-    # Get occupancy stats (whole society)
-    total_homes = Home.objects.count()
-    occupied_homes = Home.objects.filter(status='occupied').count()
+    # Occupancy stats (whole society) in one query
+    occupancy = Home.objects.aggregate(
+        total=Count('id'),
+        occupied=Count('id', filter=Q(status='occupied'))
+    )
+    total_homes = occupancy['total']
+    occupied_homes = occupancy['occupied']
     vacant_homes = total_homes - occupied_homes
     occupancy_rate = (occupied_homes / total_homes * 100) if total_homes > 0 else 0
 
-    # Get complaint stats
-    if is_union_leader:
-        total_complaints = Complaint.objects.filter(resident__in=residents, created_at__gte=thirty_days_ago).count()
-        pending_complaints = Complaint.objects.filter(resident__in=residents, created_at__gte=thirty_days_ago, status='pending').count()
-        resolved_complaints = Complaint.objects.filter(resident__in=residents, created_at__gte=thirty_days_ago, status='resolved').count()
-    else:
-        total_complaints = Complaint.objects.filter(created_at__gte=thirty_days_ago).count()
-        pending_complaints = Complaint.objects.filter(created_at__gte=thirty_days_ago, status='pending').count()
-        resolved_complaints = Complaint.objects.filter(created_at__gte=thirty_days_ago, status='resolved').count()
+    # Complaint stats in one query; pending means not yet resolved or closed
+    complaints = Complaint.objects.filter(scope, last_30_days).aggregate(
+        total=Count('id'),
+        pending=Count('id', filter=Q(status__in=['open', 'in_progress'])),
+        resolved=Count('id', filter=Q(status='resolved'))
+    )
+    total_complaints = complaints['total']
+    pending_complaints = complaints['pending']
+    resolved_complaints = complaints['resolved']
 
     # Get recent activity
-    if is_union_leader:
-        recent_bills = Bill.objects.filter(resident__in=residents).order_by('-created_at')[:5]
-        recent_payments = Payment.objects.filter(bill__resident__in=residents).order_by('-created_at')[:5]
-        recent_complaints = Complaint.objects.filter(resident__in=residents).order_by('-created_at')[:5]
-    else:
-        recent_bills = Bill.objects.order_by('-created_at')[:5]
-        recent_payments = Payment.objects.order_by('-created_at')[:5]
-        recent_complaints = Complaint.objects.order_by('-created_at')[:5]
+    recent_bills = Bill.objects.filter(scope).order_by('-created_at')[:5]
+    recent_payments = Payment.objects.filter(
+        Q(bill__resident__union_leader=request.user) if is_union_leader else Q()
+    ).order_by('-created_at')[:5]
+    recent_complaints = Complaint.objects.filter(scope).order_by('-created_at')[:5]
 
     return Response({
         'billing': {
@@ -113,8 +115,8 @@ def resident_dashboard(request):
     # Get billing stats
     bills = Bill.objects.filter(resident=resident)
     recent_bills = bills.filter(created_at__gte=thirty_days_ago)
-    total_amount = recent_bills.aggregate(total=Sum('amount'))['total'] or 0
-    total_paid = recent_bills.filter(status='paid').aggregate(total=Sum('amount'))['total'] or 0
+    total_amount = recent_bills.aggregate(total=Sum(F('amount') + F('penalty_amount')))['total'] or 0
+    total_paid = recent_bills.filter(status='paid').aggregate(total=Sum(F('amount') + F('penalty_amount')))['total'] or 0
     total_pending = total_amount - total_paid
 
     # Get complaint stats
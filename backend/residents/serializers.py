@@ -15,6 +15,27 @@ class ExpenseSerializer(serializers.ModelSerializer):
         model = Expense
         fields = '__all__'
 
+def shared_expense_allocation(union_leader_id, month):
+    """Each active resident's area-weighted share of the month's shared expenses, keyed by resident id.
+
+    The pool is every shared expense for the month on the homes of the union
+    leader's active residents; it is split by home area in exact cents.
+    """
+    from billing.allocation import allocate_to_residents
+    residents = list(
+        Resident.objects.filter(is_active=True, union_leader_id=union_leader_id)
+        .select_related('home').order_by('pk')
+    )
+    total = Expense.objects.filter(
+        home__in={resident.home_id for resident in residents if resident.home_id},
+        month__year=month.year,
+        month__month=month.month,
+        is_shared=True
+    ).aggregate(total=Sum('amount'))['total']
+    if not total:
+        return {}
+    return {resident.pk: share for resident, share in allocate_to_residents(total, residents, 'area')}
+
 class ResidentExpenseSerializer(serializers.ModelSerializer):
     total_expenses = serializers.SerializerMethodField()
     expense_breakdown = serializers.SerializerMethodField()
@@ -25,18 +46,11 @@ class ResidentExpenseSerializer(serializers.ModelSerializer):
 
     def get_total_expenses(self, obj):
         month = self.context.get('month', timezone.now().date().replace(day=1))
-        expenses = Expense.objects.filter(
-            home=obj.home,
-            month__year=month.year,
-            month__month=month.month,
-            is_shared=True
-        )
-        total = expenses.aggregate(total=Sum('amount'))['total'] or 0
-        # Calculate resident's share based on unit size ratio
-        if obj.home:
-            total_size = obj.home.size_sqft
-            return float(total) * (obj.home.size_sqft / total_size) if total_size > 0 else 0
-        return 0
+        # Allocated once per union leader and reused for every resident serialized with this context
+        allocations = self.context.setdefault('expense_allocations', {})
+        if obj.union_leader_id not in allocations:
+            allocations[obj.union_leader_id] = shared_expense_allocation(obj.union_leader_id, month)
+        return float(allocations[obj.union_leader_id].get(obj.pk, 0))
 
     def get_expense_breakdown(self, obj):
         month = self.context.get('month', timezone.now().date().replace(day=1))